@@ -0,0 +1,40 @@
+"""
+Cuenta las solicitudes salientes por álbum redirigido.
+
+Uso: python -m benchmarks.album_requests [tamaño_del_album ...]
+"""
+import asyncio
+import sys
+
+from src.actions.router import Router
+from .fake_client import FakeTelegramClient, FakeMessage
+
+
+async def measure(size: int) -> tuple:
+    client = FakeTelegramClient()
+    router = Router(1, client)
+    router.add("bench", 100, 200)
+    redirection = router.redirections["bench"]
+    messages = [FakeMessage(i + 1, -1000000000100, f"foto {i}", media=object(), grouped_id=1) for i in range(size)]
+
+    # Antes: cada mensaje del álbum se reenviaba por separado
+    for message in messages:
+        await router.forward_message(redirection, message)
+    before = sum(client.requests.values())
+
+    client.requests.clear()
+    await router.on_album(client.album(messages))
+    after = sum(client.requests.values())
+    await router.sender.close()
+    return before, after
+
+
+async def main(sizes) -> None:
+    print("tamaño  antes  después")
+    for size in sizes:
+        before, after = await measure(size)
+        print(f"{size:>6}  {before:>5}  {after:>7}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(arg) for arg in sys.argv[1:]] or [2, 5, 10]))
@@ -0,0 +1,129 @@
+"""
+Sustituto en memoria de `TelegramClient` para los benchmarks.
+
+Registra los manejadores igual que Telethon, permite inyectar eventos sintéticos
+(NewMessage, MessageEdited, Album) y simula la latencia de la API en cada llamada.
+"""
+import asyncio
+import itertools
+from collections import Counter
+from types import SimpleNamespace
+
+from telethon import events
+
+
+class FakeMessage(SimpleNamespace):
+    def __init__(self, id: int, chat_id: int, text: str = "", media=None, grouped_id=None,
+                 reply_to_msg_id=None, sender_id: int = 1, entities=None):
+        super().__init__(
+            id=id, chat_id=chat_id, text=text, message=text, raw_text=text, media=media,
+            grouped_id=grouped_id, sender_id=sender_id, entities=entities, fwd_from=None, reply_markup=None,
+            silent=False,
+            reply_to=SimpleNamespace(reply_to_msg_id=reply_to_msg_id) if reply_to_msg_id else None,
+        )
+
+    @property
+    def is_reply(self) -> bool:
+        return self.reply_to is not None
+
+
+class FakeEvent(SimpleNamespace):
+    """Evento NewMessage o MessageEdited con un solo mensaje."""
+
+    def __init__(self, client, message: FakeMessage):
+        super().__init__(client=client, message=message, chat_id=message.chat_id,
+                         grouped_id=message.grouped_id, messages=[message])
+
+
+class FakeAlbumEvent(SimpleNamespace):
+    def __init__(self, client, messages: list):
+        super().__init__(client=client, messages=messages, chat_id=messages[0].chat_id,
+                         grouped_id=messages[0].grouped_id, message=messages[0])
+
+
+class FakeTelegramClient:
+    """
+    Cliente falso: cuenta las solicitudes por método y tarda `latency` segundos en cada una.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.handlers = []
+        self.requests = Counter()
+        self._ids = itertools.count(1)
+
+    # --- Ciclo de vida -------------------------------------------------------------
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def connect(self) -> None:
+        pass
+
+    async def start(self):
+        return self
+
+    async def disconnect(self) -> None:
+        pass
+
+    # --- Manejadores -----------------------------------------------------------------
+
+    def add_event_handler(self, callback, event=None) -> None:
+        self.handlers.append((callback, event))
+
+    def remove_event_handler(self, callback, event=None) -> int:
+        before = len(self.handlers)
+        self.handlers = [(cb, ev) for cb, ev in self.handlers if cb != callback]
+        return before - len(self.handlers)
+
+    async def dispatch(self, event) -> None:
+        """Entrega un evento a los manejadores del tipo correspondiente, como haría Telethon."""
+        if isinstance(event, FakeAlbumEvent):
+            kind = events.Album
+        elif getattr(event, "edited", False):
+            kind = events.MessageEdited
+        else:
+            kind = events.NewMessage
+
+        await asyncio.gather(*(callback(event) for callback, builder in self.handlers if type(builder) is kind))
+
+    def new_message(self, message: FakeMessage) -> FakeEvent:
+        return FakeEvent(self, message)
+
+    def edited_message(self, message: FakeMessage) -> FakeEvent:
+        event = FakeEvent(self, message)
+        event.edited = True
+        return event
+
+    def album(self, messages: list) -> FakeAlbumEvent:
+        return FakeAlbumEvent(self, messages)
+
+    # --- API ---------------------------------------------------------------------------
+
+    async def call(self, method: str) -> None:
+        self.requests[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send_message(self, entity, message=None, **kwargs):
+        await self.call("send_message")
+        return SimpleNamespace(id=next(self._ids))
+
+    async def send_file(self, entity, file, **kwargs):
+        await self.call("send_file")
+        if isinstance(file, list):
+            return [SimpleNamespace(id=next(self._ids)) for _ in file]
+        return SimpleNamespace(id=next(self._ids))
+
+    async def edit_message(self, entity, message=None, **kwargs):
+        await self.call("edit_message")
+        return SimpleNamespace(id=message)
+
+    async def forward_messages(self, entity, messages, from_peer=None, **kwargs):
+        await self.call("forward_messages")
+        if isinstance(messages, list):
+            return [SimpleNamespace(id=next(self._ids)) for _ in messages]
+        return SimpleNamespace(id=next(self._ids))
+
+    async def get_input_entity(self, peer):
+        return peer
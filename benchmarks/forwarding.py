@@ -0,0 +1,192 @@
+"""
+Benchmark de rendimiento del reenvío: mensajes/s, latencia p50/p99 y memoria.
+
+Crea varios usuarios con sus redirecciones sobre clientes falsos, inyecta eventos
+NewMessage, MessageEdited y Album a un ritmo fijo y mide el tiempo desde la entrega
+del evento hasta que el enrutador termina de procesarlo.
+
+Uso:
+    python -m benchmarks.forwarding --users 20 --redirections 10 --rate 2000 --duration 5
+    python -m benchmarks.forwarding --output actual.json --compare base.json
+    python -m benchmarks.forwarding --batch-window-ms 250
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from telethon import utils
+from telethon.tl import types
+
+from src.actions import router
+from src.config import settings
+from .fake_client import FakeTelegramClient, FakeMessage
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def build_routers(args) -> list:
+    routers = []
+    for user_id in range(1, args.users + 1):
+        client = FakeTelegramClient(latency=args.latency)
+        user_router = router.Router(user_id, client)
+        user_router.attach()
+        for index in range(args.redirections):
+            source = 1000 + index % args.sources
+            options = {"batch_window_ms": args.batch_window_ms} if args.batch_window_ms else None
+            user_router.add(f"r{index}", source, 5000 + index, options)
+        routers.append(user_router)
+    return routers
+
+
+async def run(args) -> dict:
+    if not args.throttle:
+        # Medir el coste del pipeline sin los límites de envío de Telegram
+        settings.SEND_RATE_PER_CHAT = settings.SEND_BURST_PER_CHAT = 1e9
+        settings.SEND_RATE_PER_ACCOUNT = settings.SEND_BURST_PER_ACCOUNT = 1e9
+
+    rng = random.Random(args.seed)
+    tracemalloc.start()
+    routers = build_routers(args)
+    next_ids = {}
+    latencies = []
+    counts = {"new": 0, "edit": 0, "reply": 0, "album": 0}
+
+    async def inject(client, event) -> None:
+        started = time.perf_counter()
+        await client.dispatch(event)
+        latencies.append(time.perf_counter() - started)
+
+    def make_event(client, chat_id):
+        # Los IDs de mensaje son propios de cada chat visto por cada cuenta
+        key = (id(client), chat_id)
+        last_id = next_ids.get(key, 0)
+        roll = rng.random()
+        if last_id and roll < args.edit_ratio:
+            counts["edit"] += 1
+            return client.edited_message(FakeMessage(rng.randint(1, last_id), chat_id, "editado"))
+
+        if roll < args.edit_ratio + args.album_ratio:
+            counts["album"] += 1
+            group = rng.getrandbits(63)
+            messages = [FakeMessage(last_id + i + 1, chat_id, f"foto {i}", media=object(), grouped_id=group)
+                        for i in range(args.album_size)]
+            next_ids[key] = last_id + args.album_size
+            return client.album(messages)
+
+        next_ids[key] = last_id + 1
+        reply_to = None
+        if last_id and roll < args.edit_ratio + args.album_ratio + args.reply_ratio:
+            counts["reply"] += 1
+            reply_to = rng.randint(1, last_id)
+        else:
+            counts["new"] += 1
+        return client.new_message(FakeMessage(last_id + 1, chat_id, "x" * args.text_length, reply_to_msg_id=reply_to))
+
+    tasks = []
+    total = int(args.rate * args.duration)
+    started = time.perf_counter()
+    for index in range(total):
+        # Mantener el ritmo de inyección configurado
+        delay = started + index / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        user_router = rng.choice(routers)
+        source = 1000 + rng.randrange(min(args.sources, args.redirections))
+        chat_id = utils.get_peer_id(types.PeerChannel(source))
+        tasks.append(asyncio.create_task(inject(user_router.client, make_event(user_router.client, chat_id))))
+
+    await asyncio.gather(*tasks)
+    # Esperar a que salgan los lotes pendientes del modo por lotes
+    await asyncio.sleep(args.batch_window_ms / 1000)
+    for user_router in routers:
+        await asyncio.gather(*user_router.batch_tasks.values())
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    requests = {}
+    for user_router in routers:
+        for method, count in user_router.client.requests.items():
+            requests[method] = requests.get(method, 0) + count
+        await user_router.sender.close()
+
+    map_stats = {"pairs": 0, "entries": 0, "bytes": 0, "evicted": 0}
+    for user_router in routers:
+        for key, value in user_router.message_map.stats().items():
+            map_stats[key] += value
+
+    return {
+        "config": vars(args) | {"output": None, "compare": None},
+        "events": counts,
+        "events_per_sec": round(total / elapsed, 1),
+        "elapsed_sec": round(elapsed, 3),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(max(latencies, default=0) * 1000, 3),
+        },
+        "requests": requests,
+        "memory": {"peak_mb": round(peak / 2 ** 20, 2), "message_map": map_stats},
+    }
+
+
+def compare(current: dict, baseline: dict) -> None:
+    """Muestra la variación de las métricas principales respecto a una ejecución anterior."""
+    rows = [
+        ("events_per_sec", current["events_per_sec"], baseline["events_per_sec"]),
+        ("latency_p50_ms", current["latency_ms"]["p50"], baseline["latency_ms"]["p50"]),
+        ("latency_p99_ms", current["latency_ms"]["p99"], baseline["latency_ms"]["p99"]),
+        ("peak_mb", current["memory"]["peak_mb"], baseline["memory"]["peak_mb"]),
+        ("requests", sum(current["requests"].values()), sum(baseline["requests"].values())),
+    ]
+    for name, now, before in rows:
+        change = (now - before) / before * 100 if before else 0.0
+        print(f"{name:>16}: {before:>10} -> {now:>10} ({change:+.1f}%)", file=sys.stderr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--redirections", type=int, default=5, help="redirecciones por usuario")
+    parser.add_argument("--sources", type=int, default=5, help="chats de origen distintos por usuario")
+    parser.add_argument("--rate", type=float, default=1000, help="eventos por segundo")
+    parser.add_argument("--duration", type=float, default=5, help="segundos de inyección")
+    parser.add_argument("--latency", type=float, default=0.002, help="latencia simulada de la API (s)")
+    parser.add_argument("--edit-ratio", type=float, default=0.1)
+    parser.add_argument("--reply-ratio", type=float, default=0.1)
+    parser.add_argument("--album-ratio", type=float, default=0.05)
+    parser.add_argument("--album-size", type=int, default=4)
+    parser.add_argument("--text-length", type=int, default=200)
+    parser.add_argument("--batch-window-ms", type=float, default=0, help="reenviar por lotes con esta ventana")
+    parser.add_argument("--throttle", action="store_true", help="aplicar los límites de envío reales")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="guardar el resultado en un archivo JSON")
+    parser.add_argument("--compare", help="resultado JSON anterior con el que comparar")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(result, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark de la reescritura de textos en publicaciones largas.
+
+Compara la pasada única compilada (`Rewriter.apply`, con ajuste de entidades) con
+aplicar cada regla por separado (`str.replace` por literal y `re.sub` para enlaces
+y menciones), variando la longitud del texto y el número de reglas.
+
+Uso:
+    python -m benchmarks.rewrite
+    python -m benchmarks.rewrite --lengths 4096 16384 --rules 10 1000 --repeat 200
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from telethon.tl import types
+
+from src.utils.rewrite import URL_PATTERN, MENTION_PATTERN, compile_rewrite
+
+WORDS = ("oferta", "canal", "precio", "envío", "gratis", "hoy", "😀", "nuevo", "señal", "compra")
+
+
+def make_post(rng: random.Random, length: int) -> tuple[str, list]:
+    """Texto con palabras, menciones, enlaces y emojis, con una entidad de negrita cada pocas palabras."""
+    parts = []
+    entities = []
+    size = 0
+    while size < length:
+        roll = rng.random()
+        if roll < 0.05:
+            word = f"@usuario{rng.randrange(100)}"
+        elif roll < 0.08:
+            word = f"https://t.me/canal{rng.randrange(100)}/{rng.randrange(10000)}"
+        else:
+            word = rng.choice(WORDS)
+        if rng.random() < 0.1:
+            entities.append(types.MessageEntityBold(offset=size, length=len(word.encode("utf-16-le")) // 2))
+        parts.append(word)
+        size += (len(word.encode("utf-16-le")) // 2) + 1
+    return " ".join(parts), entities
+
+
+def make_spec(rules: int) -> dict:
+    replace = {f"{WORDS[index % len(WORDS)]}{index}": f"r{index}" for index in range(rules - 1)}
+    replace["oferta"] = "promoción"
+    return {
+        "replace": replace,
+        "mentions": {f"@usuario{index}": "@destino" for index in range(10)},
+        "strip_links": True,
+        "signature": "\n\nVía @destino",
+    }
+
+
+def naive(spec: dict, text: str) -> str:
+    """Una pasada por regla, como haría una implementación directa."""
+    text = re.sub(URL_PATTERN, "", text)
+    for old, new in spec["replace"].items():
+        text = text.replace(old, new)
+    mentions = {old.lower(): new for old, new in spec["mentions"].items()}
+    text = re.sub(MENTION_PATTERN, lambda match: mentions.get(match.group().lower(), match.group()), text)
+    return text + spec["signature"]
+
+
+def measure(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def run(args) -> list:
+    rng = random.Random(args.seed)
+    results = []
+    for length in args.lengths:
+        text, entities = make_post(rng, length)
+        for rules in args.rules:
+            spec = make_spec(rules)
+            started = time.perf_counter()
+            rewriter = compile_rewrite(spec)
+            compile_ms = (time.perf_counter() - started) * 1000
+            results.append({
+                "length": length,
+                "rules": rules,
+                "entities": len(entities),
+                "compile_ms": round(compile_ms, 3),
+                "single_pass_us": round(measure(lambda: rewriter.apply(text, entities), args.repeat) * 1e6, 1),
+                "per_rule_us": round(measure(lambda: naive(spec, text), args.repeat) * 1e6, 1),
+            })
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[1024, 4096, 16384], help="caracteres por texto")
+    parser.add_argument("--rules", type=int, nargs="+", default=[1, 10, 100, 1000], help="reglas de reemplazo")
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    print(json.dumps(run(parse_args(argv)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
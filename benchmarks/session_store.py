@@ -0,0 +1,117 @@
+"""
+Benchmark de los almacenes de sesiones con muchas cuentas.
+
+Crea sesiones sintéticas (clave de autorización aleatoria, sin conexión a Telegram) en
+una carpeta temporal y mide, para cada almacén, el tiempo de crear todos los clientes
+de Telethon, los descriptores de archivo abiertos mientras están vivos y el coste de
+`exists`, que es lo que consulta el control de acceso.
+
+Uso:
+    python -m benchmarks.session_store
+    python -m benchmarks.session_store --users 100 1000 --backends file sqlite
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+
+from telethon import TelegramClient
+from telethon.crypto import AuthKey
+from telethon.sessions import SQLiteSession
+
+from src.clients.session_store import (
+    DatabaseSessionStore, EncryptedFileSessionStore, FileSessionStore, SessionCipher,
+)
+
+BACKENDS = ("file", "sqlite", "sqlite-encrypted", "encrypted")
+
+
+def open_descriptors() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+def make_store(backend: str, directory: str, cipher: SessionCipher):
+    if backend == "file":
+        return FileSessionStore(directory)
+    if backend == "sqlite":
+        return DatabaseSessionStore(os.path.join(directory, "sessions.sqlite3"))
+    if backend == "sqlite-encrypted":
+        return DatabaseSessionStore(os.path.join(directory, "sessions.sqlite3"), cipher)
+    return EncryptedFileSessionStore(directory, cipher)
+
+
+def populate(store, users: list, rng: random.Random) -> None:
+    for user_id in users:
+        session = SQLiteSession()
+        session.set_dc(2, "149.154.167.51", 443)
+        session.auth_key = AuthKey(rng.randbytes(256))
+        if isinstance(store, FileSessionStore):
+            # Mismo contenido que deja Telethon tras /connect
+            on_disk = SQLiteSession(store.path(user_id))
+            on_disk.set_dc(session.dc_id, session.server_address, session.port)
+            on_disk.auth_key = session.auth_key
+            on_disk.save()
+            on_disk.close()
+        else:
+            store.save(user_id, session)
+        session.close()
+
+
+def measure(backend: str, count: int, cipher: SessionCipher) -> dict:
+    rng = random.Random(count)
+    users = [1_000_000 + index for index in range(count)]
+    with tempfile.TemporaryDirectory() as directory:
+        writer = make_store(backend, directory, cipher)
+        populate(writer, users, rng)
+        writer.close()
+        gc.collect()
+
+        # Almacén nuevo, como tras reiniciar el proceso
+        store = make_store(backend, directory, cipher)
+        baseline = open_descriptors()
+        started = time.perf_counter()
+        clients = [TelegramClient(store.open(user_id), 1, "hash") for user_id in users]
+        elapsed = time.perf_counter() - started
+        descriptors = open_descriptors() - baseline
+        authorized = sum(1 for client in clients if client.session.auth_key)
+
+        started = time.perf_counter()
+        for _ in range(10):
+            for user_id in users:
+                store.exists(user_id)
+        exists_elapsed = (time.perf_counter() - started) / (10 * count)
+
+        for client in clients:
+            client.session.close()
+        store.close()
+
+    return {
+        "backend": backend,
+        "users": count,
+        "clients_sec": round(elapsed, 3),
+        "per_client_ms": round(elapsed / count * 1000, 3),
+        "open_fds": descriptors,
+        "authorized": authorized,
+        "exists_us": round(exists_elapsed * 1e6, 2),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    cipher = SessionCipher("benchmark")
+    results = [measure(backend, count, cipher) for count in args.users for backend in args.backends]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
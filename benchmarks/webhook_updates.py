@@ -0,0 +1,93 @@
+"""
+Envía updates falsos de Telegram al webhook local para probar el modo webhook sin Telegram.
+
+Cada update es un mensaje de texto (por defecto `/menu`) de un usuario sintético. El bot
+los procesa como si fueran reales; las respuestas fallarán al llamar a la API de Telegram
+con chats inexistentes, pero la recepción, la cola y los manejadores se ejercitan igual.
+
+Uso:
+    python -m benchmarks.webhook_updates --count 500 --concurrency 20
+    python -m benchmarks.webhook_updates --url http://127.0.0.1:8443/telegram --secret s3cr3t --text /chats
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+import aiohttp
+
+from src.config import settings
+from src.webhook import SECRET_HEADER
+
+
+def fake_update(update_id: int, user_id: int, text: str) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": f"Prueba {user_id}"}
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": user["first_name"]},
+        "from": user,
+        "text": text,
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": update_id, "message": message}
+
+
+async def run(args) -> dict:
+    headers = {SECRET_HEADER: args.secret} if args.secret else {}
+    ids = itertools.count(1)
+    statuses = {}
+    latencies = []
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async def sender() -> None:
+            while (update_id := next(ids)) <= args.count:
+                payload = fake_update(update_id, args.first_user + update_id % args.users, args.text)
+                started = time.perf_counter()
+                async with session.post(args.url, json=payload) as response:
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        health_url = args.url.rsplit("/", 1)[0] + "/health"
+        async with session.get(health_url) as response:
+            health = await response.json()
+
+    latencies.sort()
+    return {
+        "updates": args.count,
+        "statuses": statuses,
+        "updates_per_sec": round(args.count / elapsed, 1),
+        "latency_ms": {
+            "p50": round(latencies[len(latencies) // 2] * 1000, 3),
+            "p99": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+        },
+        "health": health,
+    }
+
+
+def parse_args(argv=None):
+    default_url = f"http://{settings.WEBHOOK_LISTEN}:{settings.WEBHOOK_PORT}/{settings.WEBHOOK_PATH.strip('/')}"
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=default_url)
+    parser.add_argument("--secret", default=settings.WEBHOOK_SECRET)
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--users", type=int, default=10, help="usuarios sintéticos distintos")
+    parser.add_argument("--first-user", type=int, default=900000000)
+    parser.add_argument("--text", default="/menu")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    print(json.dumps(asyncio.run(run(parse_args(argv))), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,11 @@ import os
 from telegram import Update
 from telegram.ext import ContextTypes
 from telethon.sync import TelegramClient
-from telethon.tl.types import Chat, User, Channel
 from src.config.settings import API_ID, API_HASH
 import html  # Importa la librería para escapear caracteres especiales en HTML
-from src.clients.client_manager import get_or_create_client
+from src.clients.client_manager import lease
+from src.clients.dialog_cache import dialog_cache
+from src.sharding import coordinator
 
 
 async def ensure_connected(client: TelegramClient) -> None:
@@ -24,48 +25,14 @@ async def chats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "🔄 Obteniendo chats... Por favor, espera.") if update.message else None
 
     try:
-        # Obtener el cliente Telethon
-        telethon_client = await get_or_create_client(user_id)
-        await ensure_connected(telethon_client)
-
-        # Obtener los chats
-        dialogs = await telethon_client.get_dialogs()
-
-        # Listas para clasificar los chats
-        user_chats = []
-        bot_chats = []
-        channel_chats = []
-        group_chats = []
-
-        for dialog in dialogs:
-            entity = dialog.entity
-            chat_name = ""
-            chat_id = entity.id
-
-            if isinstance(entity, User):
-                # Usuario
-                if entity.bot:
-                    bot_chats.append(f"{entity.first_name or ''} | {chat_id}")
-                else:
-                    user_chats.append(
-                        f"{entity.first_name or ''} {entity.last_name or ''} | {chat_id}"
-                    )
-            elif isinstance(entity, Chat):
-                # Grupo
-                group_chats.append(f"{entity.title or ''} | {chat_id}")
-            elif isinstance(entity, Channel):
-                # Canal
-                channel_chats.append(f"{entity.title or ''} | {chat_id}")
-
-        # Enviar mensajes separados por categoría
-        if user_chats:
-            await send_message_by_category(update, "👤 Usuarios (Username/Name | ID)", user_chats)
-        if bot_chats:
-            await send_message_by_category(update, "🤖 Bots (Bot Username | ID)", bot_chats)
-        if channel_chats:
-            await send_message_by_category(update, "📡 Canales (Channel Title | ID)", channel_chats)
-        if group_chats:
-            await send_message_by_category(update, "👥 Grupos (Group Title | ID)", group_chats)
+        if coordinator.enabled():
+            # En modo multiproceso el cliente pertenece al worker dueño de la cuenta
+            await send_dialogs(update, iter_list(await coordinator.get_dialogs(user_id)))
+        else:
+            # Obtener el cliente Telethon, reservado mientras se recorren los chats
+            async with lease(user_id) as telethon_client:
+                await ensure_connected(telethon_client)
+                await send_dialogs(update, dialog_cache.iter(user_id, telethon_client))
 
     except Exception as e:
         if update.message:
@@ -77,32 +44,88 @@ async def chats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             await waiting_message.delete()
 
 
-async def send_message_by_category(update, title, chat_list):
+async def send_dialogs(update, dialogs) -> None:
+    # Recorrer los chats (desde la caché si la lista es reciente) y enviar cada
+    # categoría por fragmentos a medida que se llenan
+    streams = {
+        "user": CategoryStream(update, "👤 Usuarios (Username/Name | ID)"),
+        "bot": CategoryStream(update, "🤖 Bots (Bot Username | ID)"),
+        "channel": CategoryStream(update, "📡 Canales (Channel Title | ID)"),
+        "group": CategoryStream(update, "👥 Grupos (Group Title | ID)"),
+    }
+
+    async for category, chat_name, chat_id in dialogs:
+        await streams[category].add(f"{chat_name} | {chat_id}")
+
+    # Enviar lo que quede de cada categoría
+    for stream in streams.values():
+        await stream.flush()
+
+
+async def iter_list(items):
+    for item in items:
+        yield item
+
+
+class CategoryStream:
     """
-    Envía un mensaje con la información de una categoría específica.
-    Si la lista es demasiado grande, se divide en fragmentos.
+    Acumula las líneas de una categoría y envía un mensaje HTML cada vez que se
+    alcanza el límite de longitud de Telegram, sin esperar a tener la lista completa.
+    Los fragmentos siguientes al primero llevan el título con "(cont.)".
     """
+
     MAX_MESSAGE_LENGTH = 4096
-    message = f"<b>{title}</b>\n\n" + "\n".join([html.escape(chat) for chat in chat_list])
-    fragments = split_message(message, MAX_MESSAGE_LENGTH)
 
-    # Verificar si el update tiene un mensaje y enviarlo
-    if update.message:
-        for fragment in fragments:
-            await update.message.reply_text(fragment, parse_mode='HTML')
+    def __init__(self, update, title):
+        self.update = update
+        self.title = title
+        self.header = f"<b>{title}</b>\n\n"
+        self.lines = []
+        self.length = len(self.header)
+
+    async def add(self, chat):
+        line = html.escape(chat)
+        if self.lines and self.length + len(line) + 1 > self.MAX_MESSAGE_LENGTH:
+            await self.flush()
+        self.lines.append(line)
+        self.length += len(line) + 1
+
+    async def flush(self):
+        if not self.lines:
+            return
+
+        message = self.header + "\n".join(self.lines)
+        # Las categorías se envían intercaladas, así que cada fragmento repite el título
+        self.header = f"<b>{self.title} (cont.)</b>\n\n"
+        self.lines = []
+        self.length = len(self.header)
+
+        if self.update.message:
+            for fragment in split_message(message, self.MAX_MESSAGE_LENGTH):
+                await self.update.message.reply_text(fragment, parse_mode='HTML')
 
 
 def split_message(message, max_length):
     """
     Divide un mensaje largo en fragmentos más pequeños.
+    Recorre el mensaje con un índice en lugar de recortarlo, por lo que el coste es lineal.
     """
+    if len(message) <= max_length:
+        return [message]
+
     fragments = []
-    while len(message) > max_length:
+    start = 0
+    length = len(message.rstrip())
+    while length - start > max_length:
+        end = start + max_length
         # Buscar el último salto de línea dentro del límite
-        split_index = message[:max_length].rfind("\n")
-        if split_index == -1:  # Si no hay salto de línea, dividir en el límite
-            split_index = max_length
-        fragments.append(message[:split_index])
-        message = message[split_index:].strip()
-    fragments.append(message)  # Agregar el último fragmento
+        split_index = message.rfind("\n", start, end)
+        if split_index <= start:  # Si no hay salto de línea, dividir en el límite
+            split_index = end
+        fragments.append(message[start:split_index])
+        # Omitir los espacios y saltos de línea al inicio del siguiente fragmento
+        start = split_index
+        while start < length and message[start].isspace():
+            start += 1
+    fragments.append(message[start:length])  # Agregar el último fragmento
     return fragments
@@ -1,39 +1,29 @@
-import os
 import re
-import requests
 import telethon
 import phonenumbers
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 from telethon.sync import TelegramClient
 from datetime import datetime, timedelta
-from src.config.settings import API_ID, API_HASH, URL_API, API_KEY, SESSION_PATH
-from src.clients.client_manager import get_or_create_client
+from src.config.settings import API_ID, API_HASH
+from src.clients.api_client import api
+from src.clients.client_manager import get_or_create_client, release, retain, save_session
+from src.auth import access
 
 # Diccionario para rastrear el estado de autenticación de cada usuario
 user_states = {}
 
-# Variable global para el cliente de Telethon
-telethon_client = None
-
-
 # Función para verificar si la sesión está activa y es completa
 async def is_session_complete(user_id: int) -> bool:
-    session_file = os.path.join(SESSION_PATH, f"user_{user_id}.session")
+    # Solo la comprobación local: /connect abre la sesión en este proceso y no debe abrirla también un worker
+    return access.session_marked(user_id)
 
-    # Verificar si el archivo de sesión existe
-    if not os.path.exists(session_file):
-        return False
 
-    # Crear cliente de Telethon para verificar estado de autenticación
-    global telethon_client
-    telethon_client = await get_or_create_client(user_id)
-    await ensure_connected(telethon_client)
-
-    # Verificar si el usuario está autorizado (autenticado correctamente)
-    if await telethon_client.is_user_authorized():
-        return True
-    return False
+def finish_flow(user_id: int) -> None:
+    # Terminar el flujo de /connect y liberar la reserva del cliente
+    access.connecting.discard(user_id)
+    if user_states.pop(user_id, None) is not None:
+        release(user_id)
 
 
 async def ensure_connected(client: TelegramClient) -> None:
@@ -57,6 +47,10 @@ async def connect(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         return
 
     # Iniciar el proceso de autenticación si no hay sesión activa
+    if user_id not in user_states:
+        # El cliente queda reservado durante todo el flujo para que no se cierre entre mensajes
+        retain(user_id)
+    access.connecting.add(user_id)
     user_states[user_id] = {"stage": "phone"}  # Iniciar en la etapa de teléfono
 
     # Solicitar el número de teléfono
@@ -140,6 +134,8 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             # Intentar autenticar usando el código y el hash
             try:
                 await telethon_client.sign_in(phone, code_without_prefix, phone_code_hash=phone_code_hash)
+                save_session(user_id, telethon_client)
+                access.mark_session(user_id, True)
 
                 # Cambiar estado
                 state["stage"] = "done"
@@ -165,9 +161,10 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
                         phone=phone
                     )
                     print(api_response)
+                    access.invalidate_payment(user_id)
                 except Exception as e:
                     await update.message.reply_text(f"Error al sincronizar con la API: {str(e)}")
-                del user_states[user_id]
+                finish_flow(user_id)
 
                 # Cerrar cliente
                 await telethon_client.disconnect()
@@ -184,6 +181,8 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             try:
                 # Intentar iniciar sesión con la contraseña 2FA
                 await telethon_client.sign_in(password=password)
+                save_session(user_id, telethon_client)
+                access.mark_session(user_id, True)
 
                 # Cambiar estado
                 state["stage"] = "done"
@@ -201,7 +200,8 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
                     phone=state["phone"]
                 )
                 print(api_response)
-                del user_states[user_id]
+                access.invalidate_payment(user_id)
+                finish_flow(user_id)
 
                 # Cerrar cliente
                 await telethon_client.disconnect()
@@ -209,12 +209,12 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             except Exception as e:
                 await telethon_client.disconnect()
                 await update.message.reply_text(f"Error al autenticar con 2FA: {str(e)}")
-                del user_states[user_id]
+                finish_flow(user_id)
 
     except Exception as e:
         await telethon_client.disconnect()
         await update.message.reply_text(f"Error: {str(e)}")
-        del user_states[user_id]
+        finish_flow(user_id)
 
 
 async def create_or_update_user_in_api(user_id, username, name, phone):
@@ -235,44 +235,28 @@ async def create_or_update_user_in_api(user_id, username, name, phone):
         "createat": today.isoformat()
     }
 
-    headers = {
-        "apiKey": API_KEY,
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-
     # Paso 1: Buscar usuario en la API
-    url_get_user = URL_API + "rpc/get_user_by_id"
-    payload = {"user_id_input": user_id}
-
-    response = requests.post(url_get_user, headers=headers, json=payload)
+    status, data = await api.get_user_by_id(user_id)
 
-    if response.status_code == 200:
-        data = response.json()
+    if status == 200:
         if "error" in data and data["status_code"] == 404:
             # Usuario no encontrado, proceder a registrarlo
-            url_create_user = URL_API + "rpc/create_user"
-            payload_create = {"user_data": user_data}  # Enviar los datos con la clave 'user_data'
-
-            response_create = requests.post(url_create_user, headers=headers, json=payload_create)
-
-            if response_create.status_code == 200:
-                # Obtener el contenido del cuerpo de la respuesta
-                json_response = response_create.json()
+            status_create, json_response = await api.create_user(user_data)
 
+            if status_create == 200:
                 # Verificar que el cuerpo de la respuesta tenga el valor 201
                 if json_response == 201:
                     return f"Usuario creado con exito {json_response}"
                 else:
                     return f"Error: La respuesta no contiene el código esperado (201). Respuesta: {json_response}"
             else:
-                return f"Error al registrar el usuario. Status: {response_create.status_code}, Detalles: {response_create.text}"
+                return f"Error al registrar el usuario. Status: {status_create}, Detalles: {json_response}"
         else:
             # Usuario encontrado, devolver datos
             return {"data": data, "status_code": 200}
 
     else:
-        return {"error": f"Error en la API: {response.text}", "status_code": response.status_code}
+        return {"error": f"Error en la API: {data}", "status_code": status}
 
 async def cancel_process(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
@@ -286,7 +270,7 @@ async def cancel_process(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await telethon_client.disconnect()
 
             # Limpiar cualquier estado relacionado con este usuario
-            del user_states[user_id]
+            finish_flow(user_id)
 
             # Verificar si update.message no es None antes de intentar usarlo
             if update.message:
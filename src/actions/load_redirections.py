@@ -1,154 +1,267 @@
 # src/main.py
+import asyncio
 import time
-import aiohttp
-from telethon import events
-from src.clients.client_manager import get_or_create_client, event_handlers
+from src.actions import router
+from src.clients.api_client import api, ApiError
+from src.clients.client_manager import run_idle_eviction
+from src.clients.snapshot import snapshot
 from src.config import settings  # Configuración con URL_API, API_KEY
 
 user_redirections = {}
-active_redirections = {}
+background_tasks = set()
+
+# Marca (`updated_at`) de la fila más reciente ya aplicada, y cambios que fallaron y se reintentan
+sync_cursor = None
+failed_changes = {}
+# La reconciliación inicial y la sincronización periódica comparten `failed_changes`: se aplican de una en una
+apply_lock = asyncio.Lock()
+
+async def bot_startup(user_filter=None) -> None:
+    """
+    Inicia las redirecciones guardadas. `user_filter(user_id)` limita las cuentas
+    a iniciar, por ejemplo a las que pertenecen a un worker en modo multiproceso.
+    """
+    # Cerrar periódicamente los clientes sin uso
+    task = asyncio.create_task(run_idle_eviction())
+    background_tasks.add(task)
 
-async def bot_startup() -> None:
     print("Cargando redirecciones existentes...")
-    await load_all_redirections_from_db()
+    await load_all_redirections_from_db(user_filter)
     print("Redirecciones cargadas y configuradas.")
 
-async def load_all_redirections_from_db() -> None:
-    url = f"{settings.URL_API}/rpc/get_all_redirections"
-    headers = {
-        "apikey": settings.API_KEY,
-        "Authorization": f"Bearer {settings.API_KEY}",
-        "Content-Type": "application/json"
-    }
+    # Aplicar en caliente los cambios hechos desde otras instancias o directamente en la base de datos
+    if settings.SYNC_INTERVAL > 0:
+        task = asyncio.create_task(run_sync(user_filter, settings.SYNC_INTERVAL))
+        background_tasks.add(task)
 
-    retries = 3
-    while retries > 0:
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers) as response:
-                    if response.status == 200:
-                        redirections = await response.json()
-                        for redirection in redirections:
-                            user_id = int(redirection["user_id"])
-                            redirection_id = redirection["redirection_id"]
-                            source_chat_id = int(redirection["source_chat_id"])
-                            destination_chat_id = int(redirection["destination_chat_id"])
-
-                            if user_id not in user_redirections:
-                                user_redirections[user_id] = {}
-                            user_redirections[user_id][redirection_id] = {
-                                "source": source_chat_id,
-                                "destination": destination_chat_id
-                            }
-
-                            await start_redirection(user_id, redirection_id)
-                        break
-                    else:
-                        print(f"Error al cargar redirecciones: {response.status}")
-                        retries -= 1
-                        time.sleep(1)
-        except aiohttp.ClientError as e:
-            print(f"Error al hacer la solicitud a la API: {str(e)}. Intentando de nuevo...")
-            retries -= 1
-            time.sleep(1)
-    if retries == 0:
+async def load_all_redirections_from_db(user_filter=None) -> None:
+    started = time.perf_counter()
+
+    # Con una copia local se empieza a reenviar de inmediato y la API se consulta después
+    cached = snapshot.load_redirections()
+    if cached:
+        global sync_cursor
+        sync_cursor = snapshot.get_meta("sync_cursor")
+        await start_from_rows(cached, user_filter, started, time.perf_counter(), "copia local")
+        task = asyncio.create_task(reconcile_with_api(user_filter))
+        background_tasks.add(task)
+        return
+
+    redirections = await fetch_all_redirections()
+    fetched = time.perf_counter()
+    if redirections is None:
         print("No se pudo cargar la información después de varios intentos.")
+        return
 
-async def start_redirection(user_id: int, redirection_id: str) -> None:
-    redirection = user_redirections[user_id].get(redirection_id)
-    if not redirection or not redirection["source"] or not redirection["destination"]:
-        raise ValueError("La redirección no está completamente configurada.")
+    advance_cursor(redirections)
+    save_snapshot(redirections, user_filter)
+    await start_from_rows(redirections, user_filter, started, fetched, "API")
+
+async def start_from_rows(redirections: list, user_filter, started: float, fetched: float, origin: str) -> None:
+    if user_filter is not None:
+        redirections = [r for r in redirections if user_filter(int(r["user_id"]))]
 
-    source = redirection["source"]
-    destination = redirection["destination"]
+    # Agrupar las redirecciones por usuario para iniciar cada cliente una sola vez
+    for redirection in redirections:
+        user_id = int(redirection["user_id"])
+        user_redirections.setdefault(user_id, {})[redirection["redirection_id"]] = {
+            "source": int(redirection["source_chat_id"]),
+            "destination": int(redirection["destination_chat_id"]),
+            "options": redirection.get("options"),
+        }
+    grouped = time.perf_counter()
 
-    # Usamos la función para obtener o crear el cliente
-    client = await get_or_create_client(user_id)
+    semaphore = asyncio.Semaphore(settings.STARTUP_CONCURRENCY)
+    results = await asyncio.gather(*(
+        start_account(user_id, dict(account_redirections), semaphore)
+        for user_id, account_redirections in user_redirections.items()
+    ))
+    finished = time.perf_counter()
 
-    # Comprobar si la redirección ya está activa
-    if user_id in active_redirections and redirection_id in active_redirections[user_id]:
-        print(f"Redirección {redirection_id} ya está activa para el usuario {user_id}: {source} -> {destination}")
+    print(
+        f"Arranque desde {origin}: {len(redirections)} redirecciones de {len(results)} cuentas "
+        f"({results.count(False)} con error). "
+        f"Consulta {fetched - started:.2f}s, agrupación {grouped - fetched:.2f}s, "
+        f"clientes {finished - grouped:.2f}s, total {finished - started:.2f}s."
+    )
+
+async def reconcile_with_api(user_filter=None) -> None:
+    """
+    Tras arrancar desde la copia local, compara con la lista completa de la API y aplica
+    las diferencias, incluidas las redirecciones borradas mientras el proceso no corría.
+    """
+    redirections = await fetch_all_redirections()
+    if redirections is None:
+        print("No se pudo reconciliar con la API; se sigue con la copia local.")
         return
 
-    if user_id not in active_redirections:
-        active_redirections[user_id] = {}
+    advance_cursor(redirections)
+    async with apply_lock:
+        current = {(int(r["user_id"]), r["redirection_id"]) for r in redirections if valid_row(r)}
+        known = {(user_id, redirection_id)
+                 for user_id, account in user_redirections.items() for redirection_id in account}
+        removed = [
+            {"user_id": user_id, "redirection_id": redirection_id, "deleted": True}
+            for user_id, redirection_id in known - current
+        ]
 
-    active_redirections[user_id][redirection_id] = {"source": source, "destination": destination}
+        applied = await apply_rows([*redirections, *removed], user_filter)
+        save_snapshot([*redirections, *removed], user_filter)
+    print(f"Reconciliación con la API: {applied} redirecciones actualizadas.")
 
-    @client.on(events.NewMessage(chats=source))
-    async def forward_message(event):
-        try:
-            # Enviar el mensaje al destino
-            message = await client.send_message(destination, event.message)
-            # Guardar el ID del mensaje clonado para ediciones futuras
-            active_redirections[event.message.id] = message.id
-        except Exception as e:
-            print(f"Error al redirigir mensaje: {str(e)}")
-            return
+def valid_row(row) -> bool:
+    """Una fila de la API se puede aplicar si trae la redirección y un ID de usuario numérico."""
+    if not isinstance(row, dict) or not row.get("redirection_id"):
+        return False
+    try:
+        int(row["user_id"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return True
+
+def save_snapshot(rows: list, user_filter=None) -> None:
+    """Guarda en la copia local las filas de las cuentas de este proceso y la marca de sincronización."""
+    rows = [row for row in rows if valid_row(row) and (user_filter is None or user_filter(int(row["user_id"])))]
+    try:
+        snapshot.save_redirections(rows)
+        snapshot.set_meta("sync_cursor", sync_cursor)
+    except Exception as e:
+        print(f"Error al guardar la copia local de redirecciones: {str(e)}")
 
-    # Registrar el evento para mensajes editados
-    @client.on(events.MessageEdited(chats=source))
-    async def edit_forwarded_message(event):
+async def fetch_all_redirections() -> list | None:
+    """
+    Consulta todas las redirecciones en la API, reintentando con espera exponencial.
+    """
+    for attempt in range(settings.STARTUP_RETRIES):
         try:
-            original_message_id = event.message.id
-
-            if original_message_id in active_redirections:
-                cloned_message_id = active_redirections[original_message_id]
-
-                # Verificar si el mensaje editado tiene multimedia
-                if event.message.media:
-                    # Editar el mensaje multimedia reemplazándolo con el nuevo archivo
-                    await client.edit_message(
-                        destination,
-                        cloned_message_id,
-                        file=event.message.media,  # Nuevo archivo multimedia
-                        text=event.message.text  # Texto del mensaje
-                    )
-                else:
-                    # Editar solo el texto si no hay multimedia
-                    await client.edit_message(destination, cloned_message_id, text=event.message.text)
+            redirections = await api.get_all_redirections()
+            if redirections is not None:
+                return redirections
+        except ApiError as e:
+            print(f"Error al hacer la solicitud a la API: {str(e)}. Intentando de nuevo...")
 
-        except Exception as e:
-            print(f"Error al editar mensaje redirigido: {str(e)}")
+        if attempt + 1 < settings.STARTUP_RETRIES:
+            await asyncio.sleep(settings.STARTUP_RETRY_DELAY * 2 ** attempt)
+    return None
 
-    # Registrar el evento para respuestas a mensajes
-    @client.on(events.NewMessage(chats=source))
-    async def reply_forwarded_message(event):
-        try:
-            # Verificar si el mensaje es una respuesta a otro mensaje
-            if event.message.is_reply:
-                replied_message = await event.get_reply_message()
-                original_message_id = replied_message.id
-
-                # Verificar si el mensaje original está en active_redirections
-                if original_message_id in active_redirections:
-                    cloned_message_id = active_redirections[original_message_id]
-
-                    # Enviar la respuesta al mensaje clonado en el destino
-                    if event.message.media:
-                        await client.send_message(
-                            destination,
-                            file=event.message.media,
-                            message=event.message.text,
-                            reply_to=cloned_message_id  # Responder al mensaje clonado
-                        )
-                    else:
-                        await client.send_message(
-                            destination,
-                            message=event.message.text,
-                            reply_to=cloned_message_id  # Responder al mensaje clonado
-                        )
+async def start_account(user_id: int, redirections: dict, semaphore: asyncio.Semaphore) -> bool:
+    """
+    Inicia el cliente de un usuario con todas sus redirecciones, reintentando con espera exponencial.
+    """
+    async with semaphore:
+        for attempt in range(settings.STARTUP_RETRIES):
+            try:
+                await router.start_redirections(user_id, redirections)
+                return True
+            except ValueError as e:
+                print(f"Redirecciones del usuario {user_id} no válidas: {str(e)}")
+                return False
+            except Exception as e:
+                print(f"Error al iniciar el cliente del usuario {user_id}: {str(e)}")
+
+            if attempt + 1 < settings.STARTUP_RETRIES:
+                await asyncio.sleep(settings.STARTUP_RETRY_DELAY * 2 ** attempt)
+    return False
+
+def advance_cursor(rows: list) -> None:
+    global sync_cursor
+    # Las marcas ISO 8601 de la API se pueden comparar como texto
+    stamps = [row["updated_at"] for row in rows if row.get("updated_at")]
+    if stamps:
+        sync_cursor = max(stamps if sync_cursor is None else [*stamps, sync_cursor])
 
+async def run_sync(user_filter=None, interval: float = 30) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sync_redirections(user_filter)
         except Exception as e:
-            print(f"Error al replicar respuesta: {str(e)}")
+            # Cualquier fallo se registra y se reintenta en la siguiente vuelta sin detener la sincronización
+            print(f"Error al sincronizar redirecciones: {str(e)}")
+
+async def sync_redirections(user_filter=None) -> int:
+    """
+    Pide a la API solo las filas cambiadas desde la última sincronización y las aplica
+    al enrutador en marcha. Devuelve la cantidad de redirecciones afectadas.
+    """
+    rows = await api.get_redirection_changes(sync_cursor)
+    if rows is None:
+        return 0
+    advance_cursor(rows)
+
+    async with apply_lock:
+        applied = await apply_rows(rows, user_filter)
+        if rows:
+            save_snapshot(rows, user_filter)
+    if applied:
+        print(f"Sincronización: {applied} redirecciones actualizadas.")
+    return applied
+
+async def apply_rows(rows: list, user_filter=None) -> int:
+    # Agrupar por usuario; los cambios fallidos de la vez anterior van primero
+    changes = {}
+    for row in [*failed_changes.values(), *rows]:
+        if not valid_row(row):
+            # Una fila mal formada se descarta sin perder el resto del lote
+            print(f"Fila de redirección no válida, se ignora: {row}")
+            continue
+        user_id = int(row["user_id"])
+        if user_filter is None or user_filter(user_id):
+            changes.setdefault(user_id, []).append(row)
+    failed_changes.clear()
 
-    print(f"Redirección '{redirection_id}' iniciada automáticamente: {source} -> {destination}")
+    results = await asyncio.gather(*(apply_changes(user_id, user_rows) for user_id, user_rows in changes.items()))
+    return sum(results)
 
-    # Guardar los callbacks asociados
-    if user_id not in event_handlers:
-        event_handlers[user_id] = {}
-    event_handlers[user_id][redirection_id] = (forward_message, edit_forwarded_message, reply_forwarded_message)
+async def apply_changes(user_id: int, rows: list) -> int:
+    """
+    Aplica los cambios de un usuario en orden. Solo se tocan las redirecciones cuya
+    configuración difiere de la que está activa.
+    """
+    started = {}
+    applied = 0
+    try:
+        for row in rows:
+            redirection_id = row["redirection_id"]
+            active = router.routers.get(user_id)
+            current = active.redirections.get(redirection_id) if active else None
+
+            if row.get("deleted") or not row.get("source_chat_id") or not row.get("destination_chat_id"):
+                started.pop(redirection_id, None)
+                user_redirections.get(user_id, {}).pop(redirection_id, None)
+                if current is not None and await router.stop_redirection(user_id, redirection_id):
+                    print(f"Redirección '{redirection_id}' detenida por sincronización.")
+                    applied += 1
+                continue
+
+            redirection = {
+                "source": int(row["source_chat_id"]),
+                "destination": int(row["destination_chat_id"]),
+                "options": row.get("options"),
+            }
+            user_redirections.setdefault(user_id, {})[redirection_id] = redirection
+            if current is not None and (current["source"], current["destination"], current["options"]) == (
+                    redirection["source"], redirection["destination"], router.parse_options(redirection["options"])):
+                started.pop(redirection_id, None)
+                continue
+            started[redirection_id] = redirection
+
+        if started:
+            await router.start_redirections(user_id, started, replace=True)
+            applied += len(started)
+    except ValueError as e:
+        print(f"Redirecciones del usuario {user_id} no válidas: {str(e)}")
+    except Exception as e:
+        print(f"Error al sincronizar las redirecciones del usuario {user_id}: {str(e)}")
+        for row in rows:
+            failed_changes[(user_id, row["redirection_id"])] = row
+    return applied
+
+async def start_redirection(user_id: int, redirection_id: str) -> None:
+    redirection = user_redirections[user_id].get(redirection_id)
+    if not redirection or not redirection["source"] or not redirection["destination"]:
+        raise ValueError("La redirección no está completamente configurada.")
 
-    # Ejecutar la conexión del cliente sin desconectarlo inmediatamente
-    await client.start()
-    print(f"Cliente Telethon para {user_id} y redirección {redirection_id} está ahora activo.")
+    await router.start_redirection(
+        user_id, redirection_id, redirection["source"], redirection["destination"], redirection.get("options")
+    )
@@ -2,20 +2,17 @@ import os
 import re
 from numbers import Number
 
-import requests
-import aiohttp
-from telethon import events, TelegramClient
+from telethon import TelegramClient
 from telegram import Update
 from telegram.ext import ContextTypes
-from src.config import settings  # Configuración con URL_API, API_KEY
+from src.sharding import coordinator
+from src.sharding.ipc import IpcError
+from src.clients.api_client import api, ApiError
+from src.clients.redirection_writer import writer
 from src.config.settings import API_ID, API_HASH
-from src.clients.client_manager import get_or_create_client, event_handlers
 
 # Diccionario para rastrear redirecciones por usuario
 user_redirections = {}
-# Diccionario para almacenar los clientes de Telethon activos por usuario
-active_clients = {}
-active_redirections = {}
 
 async def start_redirection(user_id: int, redirection_id: str) -> None:
     # Obtener la redirección configurada para el usuario
@@ -23,97 +20,10 @@ async def start_redirection(user_id: int, redirection_id: str) -> None:
     if not redirection or not redirection["source"] or not redirection["destination"]:
         raise ValueError("La redirección no está completamente configurada.")
 
-    source = redirection["source"]
-    destination = redirection["destination"]
-
-    # Comprobar si ya hay un cliente activo para este usuario
-    if user_id not in active_clients:
-        # Crear cliente Telethon si no existe uno activo
-        client = await get_or_create_client(user_id)
-        await ensure_connected(client)
-        active_clients[user_id] = client  # Guardar el cliente activo
-    else:
-        # Usar el cliente ya existente
-        client = active_clients[user_id]
-
-    # Registrar el evento para nuevos mensajes
-    @client.on(events.NewMessage(chats=source))
-    async def forward_message(event):
-        try:
-            # Enviar el mensaje al destino
-            message = await client.send_message(destination, event.message)
-            # Guardar el ID del mensaje clonado para ediciones futuras
-            active_redirections[event.message.id] = message.id
-        except Exception as e:
-            print(f"Error al redirigir mensaje: {str(e)}")
-            return
-
-    # Registrar el evento para mensajes editados
-    @client.on(events.MessageEdited(chats=source))
-    async def edit_forwarded_message(event):
-        try:
-            original_message_id = event.message.id
-
-            if original_message_id in active_redirections:
-                cloned_message_id = active_redirections[original_message_id]
-
-                # Verificar si el mensaje editado tiene multimedia
-                if event.message.media:
-                    # Editar el mensaje multimedia reemplazándolo con el nuevo archivo
-                    await client.edit_message(
-                        destination,
-                        cloned_message_id,
-                        file=event.message.media,  # Nuevo archivo multimedia
-                        text=event.message.text  # Texto del mensaje
-                    )
-                else:
-                    # Editar solo el texto si no hay multimedia
-                    await client.edit_message(destination, cloned_message_id, text=event.message.text)
-
-        except Exception as e:
-            print(f"Error al editar mensaje redirigido: {str(e)}")
-
-    # Registrar el evento para respuestas a mensajes
-    @client.on(events.NewMessage(chats=source))
-    async def reply_forwarded_message(event):
-        try:
-            # Verificar si el mensaje es una respuesta a otro mensaje
-            if event.message.is_reply:
-                replied_message = await event.get_reply_message()
-                original_message_id = replied_message.id
-
-                # Verificar si el mensaje original está en active_redirections
-                if original_message_id in active_redirections:
-                    cloned_message_id = active_redirections[original_message_id]
-
-                    # Enviar la respuesta al mensaje clonado en el destino
-                    if event.message.media:
-                        await client.send_message(
-                            destination,
-                            file=event.message.media,
-                            message=event.message.text,
-                            reply_to=cloned_message_id  # Responder al mensaje clonado
-                        )
-                    else:
-                        await client.send_message(
-                            destination,
-                            message=event.message.text,
-                            reply_to=cloned_message_id  # Responder al mensaje clonado
-                        )
-
-        except Exception as e:
-            print(f"Error al replicar respuesta: {str(e)}")
-
-    print(f"Redirección '{redirection_id}' iniciada automáticamente: {source} -> {destination}")
-
-    # Guardar los callbacks asociados
-    if user_id not in event_handlers:
-        event_handlers[user_id] = {}
-    event_handlers[user_id][redirection_id] = (forward_message, edit_forwarded_message, reply_forwarded_message)
-
-    # Ejecutar la conexión del cliente sin desconectarlo inmediatamente
-    await client.start()
-    print(f"Cliente Telethon para {user_id} y redirección {redirection_id} está ahora activo.")
+    # En modo multiproceso la redirección se inicia en el worker dueño de la cuenta
+    await coordinator.start_redirection(
+        user_id, redirection_id, redirection["source"], redirection["destination"], redirection.get("options")
+    )
 
 
 # Comando para manejar redirecciones (sin cambios)
@@ -149,7 +59,7 @@ async def redirection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
             "`source - destination`"
         )
 
-        await insert_redirection_to_db(user_id, redirection_id)
+        insert_redirection_to_db(user_id, redirection_id)
 
     elif subcommand == "delete":
         # Eliminar la redirección de la base de datos
@@ -179,28 +89,14 @@ async def redirection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
 
 
 
-# Inserción de redirecciones en la base de datos (sin cambios)
-async def insert_redirection_to_db(user_id: int, redirection_id: str) -> None:
-    url = f"{settings.URL_API}/rpc/insert_redirection"
-    payload = {
-        "user_id": str(user_id),
-        "redirection_id": redirection_id
-    }
-    headers = {
-        "apikey": settings.API_KEY,
-        "Authorization": f"Bearer {settings.API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status == 201:
-                    print(f"Redirección {redirection_id} guardada correctamente en la base de datos.")
-                else:
-                    print(f"Error al guardar redirección: {response.status}")
-    except aiohttp.ClientError as e:
-        print(f"Error al hacer la solicitud a la API: {str(e)}")
+# Inserción de redirecciones en la base de datos
+def insert_redirection_to_db(user_id: int, redirection_id: str, source: int | None = None,
+                             destination: int | None = None) -> None:
+    """
+    Encola la redirección en el buffer de escritura diferida; los cambios de la misma
+    redirección se combinan y se guardan juntos con una sola solicitud a la API.
+    """
+    writer.put(user_id, redirection_id, source, destination)
 
 
 async def handle_chat_ids(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -256,12 +152,23 @@ async def handle_chat_ids(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_redirections[user_id][active_redirection]["source"] = source_chat_id
     user_redirections[user_id][active_redirection]["destination"] = destination_chat_id
 
-    # Guardar en la base de datos
-    await insert_chat_redirection(user_id, active_redirection, source_chat_id, "source")
-    await insert_chat_redirection(user_id, active_redirection, destination_chat_id, "destination")
+    # Iniciar la redirección antes de guardarla: si los chats no son válidos no se persiste nada
+    try:
+        await start_redirection(user_id, active_redirection)
+    except (ValueError, IpcError) as e:
+        rollback_chat_ids(user_id, active_redirection)
+        await update.message.reply_text(f"No se pudo iniciar la redirección '{active_redirection}': {str(e)}")
+        return
+    except Exception as e:
+        print(f"Error al iniciar la redirección '{active_redirection}' del usuario {user_id}: {str(e)}")
+        rollback_chat_ids(user_id, active_redirection)
+        await update.message.reply_text(
+            f"No se pudo iniciar la redirección '{active_redirection}'. Inténtalo de nuevo más tarde."
+        )
+        return
 
-    # Iniciar la redirección
-    await start_redirection(user_id, active_redirection)
+    # Guardar en la base de datos (ID, origen y destino en una sola escritura)
+    insert_redirection_to_db(user_id, active_redirection, source_chat_id, destination_chat_id)
 
     await update.message.reply_text(
         f"Redirección '{active_redirection}' configurada: \n"
@@ -269,71 +176,34 @@ async def handle_chat_ids(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         f"Destination: {destination_chat_id}"
     )
 
-async def insert_chat_redirection(user_id: int, redirection_id: str, chat_id: int, role: str) -> None:
-    """
-    Actualiza una redirección existente en la base de datos con los chats de origen y destino.
-    """
-    url = f"{settings.URL_API}/rpc/insert_chats_redirection"
-    payload = {
-        "p_chat_id": str(chat_id),
-        "p_role": role,
-        "p_user_id": str(user_id),
-        "p_redirection_id": f"{user_id}_{redirection_id}",
-    }
-
-    print(payload)
-    headers = {
-        "apikey": settings.API_KEY,
-        "Authorization": f"Bearer {settings.API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        if response.status_code == 204:
-            print(f"Redirección {redirection_id} guardada correctamente en la base de datos.")
-        else:
-            print(f"Error al actualizar redirección: {response.status_code}")
-    except requests.exceptions.RequestException as e:
-        print(f"Error al hacer la solicitud a la API: {str(e)}")
+def rollback_chat_ids(user_id: int, redirection_id: str) -> None:
+    """Deja la redirección pendiente de configurar y descarta su escritura aún no enviada."""
+    redirection = user_redirections.get(user_id, {}).get(redirection_id)
+    if redirection is not None:
+        redirection["source"] = None
+        redirection["destination"] = None
+    writer.discard(user_id, redirection_id)
 
 async def delete_redirection(user_id: int, redirection_id: str) -> Number:
     """
     Elimina una redirección existente de la base de datos.
     """
-    # Verificar si la redirección existe en la base de datos antes de intentar eliminarla
-    url = f"{settings.URL_API}/rpc/delete_redirection"
-    payload = {
-        "redirection_id_input": redirection_id,
-        "user_id_input": str(user_id),
-    }
-    print(payload)
-    headers = {
-        "apikey": settings.API_KEY,
-        "Authorization": f"Bearer {settings.API_KEY}",
-        "Content-Type": "application/json"
-    }
+    # Detener la redirección localmente y descartar cambios aún no guardados
+    await stop_redirection(user_id, redirection_id)
+    # Si la redirección viaja en un guardado en curso, esperar a que termine antes de borrarla
+    pending = await writer.discard_settled(user_id, redirection_id)
 
     try:
-        source = await get_chat_id_from_api(user_id, redirection_id)
-        if source is not None:
-            await stop_redirection(user_id, redirection_id, str(source))
-            print(f"Redirección {redirection_id} detenida para el usuario {user_id}")
+        status = await api.delete_redirection(user_id, redirection_id)
+        if status == 204 or (status == 400 and pending):
+            print(f"Redirección '{redirection_id}' eliminada correctamente de la base de datos.")
+            return 204
+        elif status == 400:
+            print(f"No se encontro la redireccion {redirection_id} asignada al usuario {user_id}")
+            return 400
         else:
-            print(f'No se encontro la redireccion {redirection_id} para el usuario {user_id}')
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status == 204:
-                    print(f"Redirección '{redirection_id}' eliminada correctamente de la base de datos.")
-
-                    return 204
-                elif response.status == 400:
-                    print(f"No se encontro la redireccion {redirection_id} asignada al usuario {user_id}")
-                    return 400
-                else:
-                    print(f"Error al eliminar redirección '{redirection_id}': {response.status}")
-    except aiohttp.ClientError as e:
+            print(f"Error al eliminar redirección '{redirection_id}': {status}")
+    except ApiError as e:
         print(f"Error al hacer la solicitud a la API: {str(e)}")
 
 
@@ -346,62 +216,18 @@ async def ensure_connected(client: TelegramClient) -> None:
             raise Exception(f"Error al conectar el cliente: {str(e)}")
 
 
-async def get_chat_id_from_api(user_id: int, redirection_id: str) -> str | None:
-    """
-    Consulta el chat_id de la redirección a través de la API.
-
-    :param user_id: ID del usuario.
-    :param redirection_id: ID de la redirección.
-    :return: ID del chat fuente asociado a la redirección.
-    """
-    url = f"{settings.URL_API}/rpc/get_chat_redirection_by_user_and_id"
-    payload = {
-        "redirection_id_input": redirection_id,
-        "user_id_input": str(user_id),
-    }
-    headers = {
-        "apikey": settings.API_KEY,
-        "Authorization": f"Bearer {settings.API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status != 200:
-                    return None
-
-                # Leer directamente el texto de la respuesta
-                chat_id = await response.text()
-
-                return chat_id  # Convertir a entero antes de devolver
-
-        except Exception as e:
-            raise Exception(f"Error al consultar el chat_id desde la API: {e}")
-
-
-async def stop_redirection(user_id: int, redirection_id: str, source: str) -> None:
+async def stop_redirection(user_id: int, redirection_id: str) -> None:
     """
-    Detiene una redirección activa para el usuario y elimina su evento asociado.
+    Detiene una redirección activa para el usuario y la elimina de su enrutador.
 
-    :param source:
     :param user_id: ID del usuario que solicita detener la redirección.
     :param redirection_id: ID de la redirección a detener.
     """
     try:
-
-        # Obtener o crear el cliente de Telegram
-        client = await get_or_create_client(user_id)
-
-        # Recuperar el callback almacenado
-        callback = event_handlers.get(user_id, {}).get(redirection_id)
-        if callback is None:
-            print(f"No se encontró un callback para la redirección '{redirection_id}' del usuario {user_id}.")
+        if not await coordinator.stop_redirection(user_id, redirection_id):
+            print(f"No se encontró una redirección activa '{redirection_id}' del usuario {user_id}.")
             return
 
-        # Eliminar el evento asociado a la redirección
-        client.remove_event_handler(callback, event=events.NewMessage(chats=source))
         print(f"Redirección '{redirection_id}' detenida para el usuario {user_id}.")
     except Exception as e:
         print(f"Error al detener la redirección '{redirection_id}' para el usuario {user_id}: {e}")
-
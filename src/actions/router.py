@@ -0,0 +1,578 @@
+import asyncio
+import json
+
+from telethon import events
+from telethon.tl import types
+from src.clients.client_manager import event_handlers, lease
+from src.clients.dialog_cache import dialog_cache
+from src.clients.peer_cache import index_keys, peer_cache, peer_key
+from src.clients.send_queue import SendQueue, SendQueueFull
+from src.config import settings
+from src.utils.filters import compile_filter
+from src.utils.message_map import MessageMap
+from src.utils.rewrite import compile_rewrite
+from src.utils.metrics import Counter, Gauge
+from src.utils import profiling
+
+# Diccionario global de enrutadores por usuario (uno por TelegramClient)
+routers = {}
+
+# Telegram acepta como máximo 100 IDs por solicitud de reenvío
+FORWARD_BATCH_MAX_IDS = 100
+
+forwarded_total = Counter("bot_forwarded_messages_total", "Mensajes redirigidos", ("user", "redirection"))
+edited_total = Counter("bot_edited_messages_total", "Ediciones replicadas en el destino", ("user", "redirection"))
+replied_total = Counter("bot_replied_messages_total", "Respuestas replicadas en el destino", ("user", "redirection"))
+filtered_total = Counter("bot_filtered_messages_total", "Mensajes descartados por los filtros",
+                         ("user", "redirection", "filter"))
+errors_total = Counter("bot_forward_errors_total", "Errores al redirigir", ("user", "redirection", "operation"))
+
+
+def parse_options(options) -> dict:
+    """Opciones de una redirección tal como llegan de la API (objeto JSON, texto o nulo)."""
+    if not options:
+        return {}
+    if isinstance(options, str):
+        options = json.loads(options)
+    return dict(options)
+
+
+def media_to_send(message):
+    """Multimedia que se puede reenviar como archivo; las vistas previas de enlaces no lo son."""
+    if message.media is None or isinstance(message.media, types.MessageMediaWebPage):
+        return None
+    return message.media
+
+
+class Router:
+    """
+    Enrutador de eventos de un cliente Telethon.
+    Registra un único manejador por tipo de evento y reparte cada actualización
+    a las redirecciones de su chat de origen mediante un índice `chat_id -> [redirecciones]`.
+    """
+
+    def __init__(self, user_id: int, client):
+        self.user_id = user_id
+        self.client = client
+        self.redirections = {}
+        self.index = {}
+        # Mensajes en espera de las redirecciones con envío por lotes, y el último lote en curso
+        self.batches = {}
+        self.batch_tasks = {}
+        # Lote al que pertenece cada mensaje aún sin reenviar, para aplazar sus ediciones
+        self.batched = {}
+        # IDs de mensajes clonados para ediciones y respuestas
+        self.message_map = MessageMap(
+            max_entries=settings.MESSAGE_MAP_MAX_ENTRIES,
+            max_age=settings.MESSAGE_MAP_MAX_AGE,
+            max_pairs=settings.MESSAGE_MAP_MAX_PAIRS,
+        )
+        # Cola de envíos salientes con límites por destino y por cuenta
+        self.sender = SendQueue(
+            rate_per_chat=settings.SEND_RATE_PER_CHAT,
+            burst_per_chat=settings.SEND_BURST_PER_CHAT,
+            rate_per_account=settings.SEND_RATE_PER_ACCOUNT,
+            burst_per_account=settings.SEND_BURST_PER_ACCOUNT,
+            max_retries=settings.SEND_MAX_RETRIES,
+            max_flood_wait=settings.SEND_MAX_FLOOD_WAIT,
+            max_queue=settings.SEND_QUEUE_MAX_SIZE,
+            account=user_id,
+        )
+        # Callbacks registrados en Telethon, envueltos para el modo de perfilado
+        self.handlers = tuple(
+            profiling.wrap(f"telethon.{handler.__name__}", handler)
+            for handler in (self.on_new_message, self.on_message_edited, self.on_album)
+        )
+
+    def attach(self) -> None:
+        on_new_message, on_message_edited, on_album = self.handlers
+        self.client.add_event_handler(on_new_message, events.NewMessage())
+        self.client.add_event_handler(on_message_edited, events.MessageEdited())
+        self.client.add_event_handler(on_album, events.Album())
+
+    def detach(self) -> None:
+        for handler in self.handlers:
+            self.client.remove_event_handler(handler)
+
+    def add(self, redirection_id: str, source: int, destination: int, options=None,
+            message_filter=None, rewriter=None, peers=None) -> bool:
+        """
+        Agrega una redirección. `message_filter` y `rewriter` son el filtro y las reglas de
+        reescritura ya compiladas con `compile_filter` y `compile_rewrite`; `peers` son los
+        InputPeers `(origen, destino)` ya resueltos con `peer_cache`.
+        """
+        if redirection_id in self.redirections:
+            return False
+
+        source_peer, destination_peer = peers or (None, None)
+        redirection = {
+            "id": redirection_id,
+            "source": int(source),
+            "destination": int(destination),
+            # Los envíos usan el InputPeer resuelto y así Telethon no busca la entidad en cada llamada
+            "destination_peer": destination_peer if destination_peer is not None else int(destination),
+            # Con el origen resuelto se indexa solo su ID marcado exacto
+            "keys": index_keys(source_peer, source),
+            "options": parse_options(options),
+            "filter": message_filter,
+            "rewrite": rewriter,
+        }
+        self.redirections[redirection_id] = redirection
+        for key in redirection["keys"]:
+            self.index.setdefault(key, []).append(redirection)
+        return True
+
+    def replace(self, redirection_id: str, source: int, destination: int, options=None,
+                message_filter=None, rewriter=None, peers=None) -> bool:
+        """
+        Agrega o reemplaza la configuración de una redirección. Si el origen y el destino no
+        cambian se conservan los IDs de los mensajes ya clonados.
+        """
+        current = self.redirections.get(redirection_id)
+        if current is not None:
+            same_pair = (current["source"], current["destination"]) == (int(source), int(destination))
+            self.remove(redirection_id, drop_messages=not same_pair)
+        return self.add(redirection_id, source, destination, options, message_filter, rewriter, peers)
+
+    def remove(self, redirection_id: str, drop_messages: bool = True) -> bool:
+        redirection = self.redirections.pop(redirection_id, None)
+        if redirection is None:
+            return False
+
+        # Los mensajes aún no enviados de esta redirección se descartan
+        batch = self.batches.pop(redirection_id, None)
+        if batch is not None:
+            batch["timer"].cancel()
+            self.release_batch(redirection_id, batch)
+
+        for key in redirection["keys"]:
+            targets = self.index.get(key, [])
+            if redirection in targets:
+                targets.remove(redirection)
+            if not targets:
+                self.index.pop(key, None)
+
+        pair = (redirection["source"], redirection["destination"])
+        if drop_messages and not any((r["source"], r["destination"]) == pair for r in self.redirections.values()):
+            self.message_map.drop(*pair)
+        return True
+
+    async def on_new_message(self, event):
+        # El mismo manejador mantiene al día la lista de chats de /chats
+        dialog_cache.observe(self.user_id, event)
+
+        # Los mensajes de un álbum se reenvían juntos desde on_album
+        if event.message.grouped_id:
+            return
+
+        targets = self.index.get(event.chat_id)
+        if not targets:
+            return
+
+        # Cada destino tiene su propia cola, así que las redirecciones se atienden en paralelo
+        await asyncio.gather(*(
+            self.forward_message(redirection, event.message)
+            for redirection in targets
+            if self.accepts(redirection, event.message) and not self.add_to_batch(redirection, [event.message])
+        ))
+
+    async def on_album(self, event):
+        targets = self.index.get(event.chat_id)
+        if not targets:
+            return
+
+        await asyncio.gather(*(
+            self.forward_album(redirection, event)
+            for redirection in targets
+            if self.accepts(redirection, *event.messages) and not self.add_to_batch(redirection, event.messages)
+        ))
+
+    async def on_message_edited(self, event):
+        targets = self.index.get(event.chat_id)
+        if not targets:
+            return
+
+        await asyncio.gather(*(
+            self.edit_forwarded_message(redirection, event)
+            for redirection in targets
+            if not self.defer_edit(redirection, event)
+        ))
+
+    def accepts(self, redirection, *messages) -> bool:
+        """
+        Aplica el filtro de la redirección antes de cualquier llamada a Telegram.
+        Con varios mensajes (un álbum) basta con que pase uno.
+        """
+        message_filter = redirection["filter"]
+        if message_filter is None:
+            return True
+
+        if len(messages) == 1:
+            rejected = message_filter.check(messages[0])
+        else:
+            rejected = message_filter.check_album(messages)
+        if rejected is None:
+            return True
+        filtered_total.inc(self.user_id, redirection["id"], rejected)
+        return False
+
+    @staticmethod
+    def replied_id(message) -> int | None:
+        """ID del mensaje al que responde, solo si la respuesta es dentro del mismo chat de origen."""
+        header = message.reply_to
+        if getattr(header, "reply_to_peer_id", None) is not None:
+            return None
+        return getattr(header, "reply_to_msg_id", None)
+
+    def reply_target(self, redirection, message) -> int | None:
+        """ID del mensaje clonado al que debe responder la copia, resuelto con el mapeo local."""
+        reply_to_msg_id = self.replied_id(message)
+        if reply_to_msg_id is None:
+            return None
+        return self.message_map.get(redirection["source"], redirection["destination"], reply_to_msg_id)
+
+    async def forward_message(self, redirection, message):
+        try:
+            destination = redirection["destination"]
+            # Si es una respuesta a un mensaje ya redirigido, la copia responde al mensaje clonado
+            reply_to = self.reply_target(redirection, message)
+            rewriter = redirection["rewrite"]
+            if rewriter is None:
+                # Enviar el mensaje al destino tal cual
+                cloned = await self.sender.submit(
+                    destination, self.client.send_message, redirection["destination_peer"], message, reply_to=reply_to
+                )
+            else:
+                # Enviar el texto reescrito con sus entidades ya ajustadas
+                text, entities = rewriter.apply(message.message, message.entities)
+                file = media_to_send(message)
+                if not text.strip() and file is None:
+                    # Telegram no admite mensajes vacíos, p. ej. un mensaje de solo enlaces con strip_links
+                    filtered_total.inc(self.user_id, redirection["id"], "empty")
+                    return
+                # Conservar los botones y el envío silencioso, igual que al enviar el mensaje tal cual
+                cloned = await self.sender.submit(
+                    destination, self.client.send_message, redirection["destination_peer"], text,
+                    formatting_entities=entities, file=file, reply_to=reply_to,
+                    buttons=message.reply_markup, silent=message.silent
+                )
+            # Guardar el ID del mensaje clonado para ediciones y respuestas futuras
+            self.message_map.put(redirection["source"], redirection["destination"], message.id, cloned.id)
+            forwarded_total.inc(self.user_id, redirection["id"])
+            if reply_to is not None:
+                replied_total.inc(self.user_id, redirection["id"])
+        except SendQueueFull:
+            # Destino saturado: el descarte ya se cuenta en bot_send_dropped_total
+            pass
+        except Exception as e:
+            errors_total.inc(self.user_id, redirection["id"], "forward")
+            print(f"Error al redirigir mensaje: {str(e)}")
+
+    def add_to_batch(self, redirection, messages: list) -> bool:
+        """
+        Acumula mensajes de una redirección con la opción `batch_window_ms` para reenviarlos
+        juntos al cerrarse la ventana o al llegar a 100 mensajes. Devuelve False si la
+        redirección envía cada mensaje por separado.
+        """
+        window = redirection["options"].get("batch_window_ms")
+        # forward_messages reenvía el contenido original, así que no admite reescritura
+        if not window or redirection["rewrite"] is not None:
+            return False
+
+        redirection_id = redirection["id"]
+        batch = self.batches.get(redirection_id)
+        if batch is None:
+            timer = asyncio.get_running_loop().call_later(window / 1000, self.flush_batch, redirection_id)
+            batch = self.batches[redirection_id] = {"messages": [], "timer": timer, "edits": {}}
+        batch["messages"].extend(messages)
+        batched = self.batched.setdefault(redirection_id, {})
+        for message in messages:
+            batched[message.id] = batch
+
+        if len(batch["messages"]) >= FORWARD_BATCH_MAX_IDS:
+            self.flush_batch(redirection_id)
+        return True
+
+    def flush_batch(self, redirection_id: str) -> None:
+        batch = self.batches.pop(redirection_id, None)
+        redirection = self.redirections.get(redirection_id)
+        if batch is None or redirection is None:
+            return
+        batch["timer"].cancel()
+
+        # Cada lote espera al anterior de la misma redirección para conservar el orden
+        previous = self.batch_tasks.get(redirection_id)
+        task = asyncio.create_task(self.forward_batch(redirection, batch, previous))
+        self.batch_tasks[redirection_id] = task
+        task.add_done_callback(lambda done: self.batch_done(redirection_id, done))
+
+    def batch_done(self, redirection_id: str, task) -> None:
+        if self.batch_tasks.get(redirection_id) is task:
+            del self.batch_tasks[redirection_id]
+
+    def release_batch(self, redirection_id: str, batch) -> list:
+        """Deja de asociar los mensajes del lote y devuelve las ediciones que llegaron mientras esperaba."""
+        batched = self.batched.get(redirection_id, {})
+        for message in batch["messages"]:
+            if batched.get(message.id) is batch:
+                del batched[message.id]
+        if not batched:
+            self.batched.pop(redirection_id, None)
+        return list(batch["edits"].values())
+
+    def defer_edit(self, redirection, event) -> bool:
+        """
+        Guarda la edición de un mensaje que aún está en un lote sin reenviar; se aplica
+        cuando el lote se ha enviado. Solo se conserva la última edición de cada mensaje.
+        """
+        batch = self.batched.get(redirection["id"], {}).get(event.message.id)
+        if batch is None:
+            return False
+        batch["edits"][event.message.id] = event
+        return True
+
+    async def forward_batch(self, redirection, batch, previous=None):
+        if previous is not None:
+            await asyncio.wait([previous])
+
+        # Las respuestas a mensajes ya redirigidos no se pueden reenviar con reply_to,
+        # así que cortan el lote y se envían por separado en su posición. Si responden a un
+        # mensaje del mismo lote, primero se envía el tramo anterior para conocer su copia.
+        messages = batch["messages"]
+        pending = {message.id for message in messages}
+        try:
+            run = []
+            for message in messages:
+                replied = self.replied_id(message)
+                if replied is None or (replied not in pending and self.reply_target(redirection, message) is None):
+                    run.append(message)
+                    if len(run) == FORWARD_BATCH_MAX_IDS:
+                        await self.forward_run(redirection, run)
+                        run = []
+                    continue
+
+                if run:
+                    await self.forward_run(redirection, run)
+                    run = []
+                await self.forward_message(redirection, message)
+            if run:
+                await self.forward_run(redirection, run)
+        finally:
+            edits = self.release_batch(redirection["id"], batch)
+
+        # Con el lote ya reenviado, las ediciones encuentran el mensaje clonado
+        for event in edits:
+            await self.edit_forwarded_message(redirection, event)
+
+    async def forward_run(self, redirection, messages: list):
+        try:
+            # Reenviar varios mensajes al destino en una sola solicitud, sin la cabecera de reenvío
+            destination = redirection["destination"]
+            sent = await self.sender.submit(
+                destination, self.client.forward_messages, redirection["destination_peer"], messages, drop_author=True
+            )
+            # Telegram devuelve los mensajes en el mismo orden; los que no se reenviaron vienen como None
+            for original, cloned in zip(messages, sent):
+                if cloned is not None:
+                    self.message_map.put(redirection["source"], destination, original.id, cloned.id)
+            forwarded_total.inc(self.user_id, redirection["id"], amount=sum(1 for cloned in sent if cloned is not None))
+        except SendQueueFull:
+            # Destino saturado: el descarte ya se cuenta en bot_send_dropped_total
+            pass
+        except Exception as e:
+            errors_total.inc(self.user_id, redirection["id"], "batch")
+            print(f"Error al redirigir lote de mensajes: {str(e)}")
+
+    async def forward_album(self, redirection, event):
+        try:
+            # Enviar todo el álbum al destino en una sola solicitud
+            destination = redirection["destination"]
+            rewriter = redirection["rewrite"]
+            if rewriter is None:
+                captions = [message.text or "" for message in event.messages]
+            else:
+                captions = [rewriter.apply_markdown(message.message, message.entities) for message in event.messages]
+            messages = await self.sender.submit(
+                destination,
+                self.client.send_file,
+                redirection["destination_peer"],
+                file=[message.media for message in event.messages],
+                caption=captions
+            )
+            # Guardar los IDs de los mensajes clonados en el mismo orden que el original
+            for original, cloned in zip(event.messages, messages):
+                self.message_map.put(redirection["source"], redirection["destination"], original.id, cloned.id)
+            forwarded_total.inc(self.user_id, redirection["id"], amount=len(event.messages))
+        except SendQueueFull:
+            # Destino saturado: el descarte ya se cuenta en bot_send_dropped_total
+            pass
+        except Exception as e:
+            errors_total.inc(self.user_id, redirection["id"], "album")
+            print(f"Error al redirigir álbum: {str(e)}")
+
+    async def edit_forwarded_message(self, redirection, event):
+        destination = redirection["destination"]
+        try:
+            cloned_message_id = self.message_map.get(redirection["source"], destination, event.message.id)
+
+            if cloned_message_id is not None:
+                rewriter = redirection["rewrite"]
+                if rewriter is not None:
+                    # Editar con el texto reescrito y sus entidades ajustadas
+                    text, entities = rewriter.apply(event.message.message, event.message.entities)
+                    file = media_to_send(event.message)
+                    if not text.strip() and file is None:
+                        # Igual que al enviar: no se puede dejar el mensaje sin texto ni multimedia
+                        return
+                    await self.sender.submit(
+                        destination, self.client.edit_message, redirection["destination_peer"], cloned_message_id,
+                        text=text, formatting_entities=entities, file=file, buttons=event.message.reply_markup
+                    )
+                # Verificar si el mensaje editado tiene multimedia
+                elif event.message.media:
+                    # Editar el mensaje multimedia reemplazándolo con el nuevo archivo
+                    await self.sender.submit(
+                        destination,
+                        self.client.edit_message,
+                        redirection["destination_peer"],
+                        cloned_message_id,
+                        file=event.message.media,  # Nuevo archivo multimedia
+                        text=event.message.text  # Texto del mensaje
+                    )
+                else:
+                    # Editar solo el texto si no hay multimedia
+                    await self.sender.submit(
+                        destination, self.client.edit_message, redirection["destination_peer"], cloned_message_id,
+                        text=event.message.text
+                    )
+                edited_total.inc(self.user_id, redirection["id"])
+
+        except SendQueueFull:
+            # Destino saturado: el descarte ya se cuenta en bot_send_dropped_total
+            pass
+        except Exception as e:
+            errors_total.inc(self.user_id, redirection["id"], "edit")
+            print(f"Error al editar mensaje redirigido: {str(e)}")
+
+
+def send_queue_depths() -> dict:
+    """Operaciones pendientes por usuario y destino."""
+    return {user_id: router.sender.depth() for user_id, router in routers.items()}
+
+
+def message_map_stats() -> dict:
+    """Estadísticas de memoria agregadas de los mapeos de mensajes de todos los enrutadores."""
+    totals = {"pairs": 0, "entries": 0, "bytes": 0, "evicted": 0}
+    for router in routers.values():
+        for key, value in router.message_map.stats().items():
+            totals[key] += value
+    return totals
+
+
+Gauge("bot_send_queue_depth", "Envíos pendientes por usuario y destino", ("user", "destination"),
+      collect=lambda: {(user_id, destination): depth
+                       for user_id, depths in send_queue_depths().items() for destination, depth in depths.items()})
+Gauge("bot_message_map", "Tamaño de los mapeos de mensajes clonados", ("stat",),
+      collect=lambda: {(stat,): value for stat, value in message_map_stats().items()})
+
+
+async def start_redirection(user_id: int, redirection_id: str, source: int, destination: int,
+                            options=None) -> None:
+    """
+    Activa una redirección en el enrutador del cliente del usuario.
+    """
+    await start_redirections(
+        user_id, {redirection_id: {"source": source, "destination": destination, "options": options}}
+    )
+
+
+async def start_redirections(user_id: int, redirections: dict, replace: bool = False) -> None:
+    """
+    Activa varias redirecciones `{redirection_id: {"source", "destination", "options"}}` de un mismo usuario.
+    El cliente se inicia y los manejadores se registran solo la primera vez. Con `replace`,
+    las redirecciones ya activas se actualizan con la nueva configuración.
+    """
+    # Validar y compilar los filtros y las reglas de reescritura antes de tocar el cliente
+    prepared = {}
+    for redirection_id, redirection in redirections.items():
+        if not redirection["source"] or not redirection["destination"]:
+            raise ValueError("La redirección no está completamente configurada.")
+        options = parse_options(redirection.get("options"))
+        prepared[redirection_id] = (
+            redirection["source"], redirection["destination"], options,
+            compile_filter(options.get("filters")), compile_rewrite(options.get("rewrite")),
+        )
+
+    # Usamos la función para obtener o crear el cliente, reservado hasta registrar los manejadores
+    async with lease(user_id) as client:
+        await activate(user_id, client, prepared, replace)
+
+
+async def activate(user_id: int, client, prepared: dict, replace: bool) -> None:
+    # Resolver origen y destino una sola vez; las redirecciones con chats inaccesibles se descartan
+    peers = await peer_cache.resolve(
+        user_id, client, [chat_id for source, destination, *_ in prepared.values() for chat_id in (source, destination)]
+    )
+    invalid = {}
+    for redirection_id, (source, destination, *_) in prepared.items():
+        unreachable = [chat_id for chat_id in (int(source), int(destination)) if chat_id not in peers]
+        if unreachable:
+            invalid[redirection_id] = f"La cuenta no tiene acceso al chat {unreachable[0]}."
+        elif peer_key(peers[int(source)]) == peer_key(peers[int(destination)]):
+            invalid[redirection_id] = "El origen y el destino son el mismo chat."
+    if len(invalid) == len(prepared):
+        raise ValueError(" ".join(invalid.values()))
+    for redirection_id, reason in invalid.items():
+        print(f"Redirección '{redirection_id}' del usuario {user_id} no válida: {reason}")
+        del prepared[redirection_id]
+
+    router = routers.get(user_id)
+    is_new = router is None
+    if is_new:
+        router = Router(user_id, client)
+        router.attach()
+        routers[user_id] = router
+        # Guardar los callbacks asociados
+        event_handlers[user_id] = router.handlers
+
+    for redirection_id, (source, destination, options, message_filter, rewriter) in prepared.items():
+        pair = (peers[int(source)], peers[int(destination)])
+        if replace and redirection_id in router.redirections:
+            router.replace(redirection_id, source, destination, options, message_filter, rewriter, pair)
+            print(f"Redirección '{redirection_id}' actualizada: {source} -> {destination}")
+            continue
+        if not router.add(redirection_id, source, destination, options, message_filter, rewriter, pair):
+            print(f"Redirección {redirection_id} ya está activa para el usuario {user_id}: {source} -> {destination}")
+            continue
+
+        print(f"Redirección '{redirection_id}' iniciada automáticamente: {source} -> {destination}")
+
+    if is_new:
+        # Ejecutar la conexión del cliente sin desconectarlo inmediatamente
+        try:
+            await client.start()
+        except Exception:
+            router.detach()
+            del routers[user_id]
+            event_handlers.pop(user_id, None)
+            raise
+        print(f"Cliente Telethon para {user_id} está ahora activo.")
+
+
+async def stop_redirection(user_id: int, redirection_id: str) -> bool:
+    """
+    Detiene una redirección activa. Si el usuario no tiene más redirecciones,
+    se eliminan los manejadores de su cliente.
+    """
+    router = routers.get(user_id)
+    if router is None or not router.remove(redirection_id):
+        return False
+
+    if not router.redirections:
+        router.detach()
+        for task in router.batch_tasks.values():
+            task.cancel()
+        await router.sender.close()
+        del routers[user_id]
+        event_handlers.pop(user_id, None)
+    return True
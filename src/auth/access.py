@@ -0,0 +1,192 @@
+import re
+import time
+from datetime import datetime, timezone
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from src.clients.api_client import api, ApiError
+from src.clients.session_store import session_store
+from src.config import settings
+from src.sharding import coordinator
+from src.utils.metrics import Counter
+
+access_checks_total = Counter("bot_access_checks_total", "Comprobaciones de acceso por tipo y resultado",
+                              ("check", "result"))
+
+# Comandos que actúan sobre la cuenta conectada: requieren sesión y suscripción vigente
+ACCOUNT_COMMANDS = {"chats", "redirection"}
+CHAT_IDS_PATTERN = re.compile(r'^\d+\s*-\s*\d+$')
+
+# Estado cacheado por usuario: `{user_id: (valor, caduca_en)}`
+_sessions = {}
+_payments = {}
+# Usuarios con un /connect en curso: el proceso del bot tiene su sesión abierta
+connecting = set()
+
+
+def is_allowed(user_id: int) -> bool:
+    """Con la lista `ALLOWED_USERS` vacía el bot está abierto a todos."""
+    return not settings.ALLOWED_USERS or user_id in settings.ALLOWED_USERS
+
+
+def _cached(cache: dict, user_id: int):
+    entry = cache.get(user_id)
+    if entry is not None and entry[1] > time.monotonic():
+        return entry
+    return None
+
+
+def _store(cache: dict, user_id: int, value, ttl: float) -> None:
+    cache[user_id] = (value, time.monotonic() + ttl)
+
+
+async def check_session(user_id: int) -> bool:
+    """
+    Comprueba contra Telegram si la sesión guardada del usuario está autorizada. La consulta
+    la hace el proceso dueño de la cuenta; aquí solo se mira si existe la sesión.
+    """
+    if not session_store.exists(user_id):
+        return False
+    if user_id in connecting:
+        # No abrir la sesión también en el worker mientras /connect la usa aquí
+        return session_marked(user_id)
+    return await coordinator.session_authorized(user_id)
+
+
+def session_marked(user_id: int) -> bool:
+    """Comprobación local, sin abrir la sesión: existe y /connect la marcó como autorizada."""
+    if not session_store.exists(user_id):
+        return False
+    entry = _cached(_sessions, user_id)
+    return entry is not None and entry[0]
+
+
+async def session_authorized(user_id: int) -> bool:
+    entry = _cached(_sessions, user_id)
+    if entry is not None:
+        access_checks_total.inc("session", "cache")
+        return entry[0]
+
+    authorized = await check_session(user_id)
+    access_checks_total.inc("session", "network")
+    # Las sesiones no autorizadas caducan antes para que un /connect de otra instancia se note pronto
+    _store(_sessions, user_id, authorized,
+           settings.ACCESS_CACHE_TTL if authorized else settings.ACCESS_NEGATIVE_CACHE_TTL)
+    return authorized
+
+
+def mark_session(user_id: int, authorized: bool) -> None:
+    """Actualiza la caché tras iniciar o cerrar sesión sin volver a consultar a Telegram."""
+    _store(_sessions, user_id, authorized, settings.ACCESS_CACHE_TTL)
+
+
+def parse_payment_date(value) -> datetime | None:
+    if not value:
+        return None
+    try:
+        paid_until = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if paid_until.tzinfo is None:
+        # La API guarda las fechas en hora local, igual que `create_or_update_user_in_api`
+        paid_until = paid_until.astimezone()
+    return paid_until
+
+
+async def fetch_payment_date(user_id: int) -> datetime | None:
+    status, data = await api.get_user_by_id(user_id)
+    if status != 200:
+        raise ApiError(f"Error en la API: {data}")
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if not isinstance(data, dict) or "error" in data:
+        return None
+    return parse_payment_date(data.get("paymentdate"))
+
+
+async def payment_active(user_id: int) -> bool:
+    entry = _cached(_payments, user_id)
+    if entry is not None:
+        access_checks_total.inc("payment", "cache")
+        paid_until = entry[0]
+    else:
+        try:
+            paid_until = await fetch_payment_date(user_id)
+        except ApiError as e:
+            # Si la API no responde no se bloquea al usuario; se vuelve a consultar en la siguiente orden
+            print(f"Error al consultar la suscripción del usuario {user_id}: {str(e)}")
+            access_checks_total.inc("payment", "error")
+            return True
+        access_checks_total.inc("payment", "network")
+        _store(_payments, user_id, paid_until, settings.ACCESS_CACHE_TTL)
+
+    # La fecha se guarda en caché y se compara en cada consulta, así caduca a su hora exacta
+    return paid_until is not None and paid_until >= datetime.now(timezone.utc)
+
+
+def invalidate_payment(user_id: int) -> None:
+    """Olvida la suscripción cacheada, p. ej. tras registrar al usuario o renovar el pago."""
+    _payments.pop(user_id, None)
+
+
+def invalidate(user_id: int) -> None:
+    _sessions.pop(user_id, None)
+    _payments.pop(user_id, None)
+
+
+def requires_account(update: Update) -> bool:
+    message = update.message
+    if message is None or not message.text:
+        return False
+    text = message.text.strip()
+    if text.startswith("/"):
+        command = text[1:].split(maxsplit=1)[0].split("@", 1)[0] if len(text) > 1 else ""
+        return command.lower() in ACCOUNT_COMMANDS
+    return bool(CHAT_IDS_PATTERN.match(text))
+
+
+async def deny(update: Update, text: str) -> None:
+    if update.callback_query:
+        await update.callback_query.answer(text, show_alert=True)
+    elif update.effective_message:
+        await update.effective_message.reply_text(text)
+    raise ApplicationHandlerStop
+
+
+async def run_check(update: Update, check: str, func, user_id: int) -> bool:
+    """Ejecuta una comprobación; si falla de forma inesperada se deniega la orden en lugar de dejarla pasar."""
+    try:
+        return await func(user_id)
+    except Exception as e:
+        print(f"Error en la comprobación de {check} del usuario {user_id}: {str(e)}")
+        access_checks_total.inc(check, "error")
+        await deny(update, "No se pudo comprobar tu cuenta en este momento. Inténtalo de nuevo más tarde.")
+
+
+async def access_guard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Control de acceso común a todos los manejadores, registrado en un grupo previo.
+
+    La lista de usuarios permitidos se aplica a cualquier update. La sesión y la
+    suscripción solo se exigen en las órdenes que usan la cuenta conectada; /start,
+    /menu y el flujo de /connect quedan libres para poder conectarse o renovar.
+    """
+    user = update.effective_user if isinstance(update, Update) else None
+    if user is None:
+        return
+
+    if not is_allowed(user.id):
+        access_checks_total.inc("allowlist", "denied")
+        await deny(update, "No tienes permiso para usar este bot.")
+
+    if not requires_account(update):
+        return
+
+    if not await run_check(update, "session", session_authorized, user.id):
+        access_checks_total.inc("session", "denied")
+        await deny(update, "Debes conectar tu cuenta con /connect para usar este comando.")
+
+    if not await run_check(update, "payment", payment_active, user.id):
+        access_checks_total.inc("payment", "denied")
+        await deny(update, "Tu suscripción ha vencido. Renuévala para seguir usando este comando.")
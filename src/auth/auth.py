@@ -1,10 +1,10 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from src.config.settings import ALLOWED_USERS
+from src.auth.access import is_allowed
 
 async def is_authenticated(update: Update, context: ContextTypes.DEFAULT_TYPE, next_handler):
-    user_id = str(update.effective_user.id)
-    if user_id not in ALLOWED_USERS:
+    # El control general lo hace `access.access_guard`; esto queda para envolver manejadores sueltos
+    if not is_allowed(update.effective_user.id):
         await update.message.reply_text("No tienes permiso para usar este bot.")
         return
     await next_handler(update, context)
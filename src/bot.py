@@ -1,18 +1,47 @@
 import asyncio
 
-from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, MessageHandler, filters
+from telegram import Update
+from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, filters
 from config.settings import TELEGRAM_TOKEN
 from handlers.start import start
 from handlers.menu import menu, handle_callback_query, handle_back
 from actions.connect import connect, handle_user_message, cancel_process
 from actions.chats import chats
 from actions.redirection import redirection, handle_chat_ids
+from src.auth.access import access_guard
+from src.clients.api_client import api
+from src.clients.redirection_writer import writer
+from src.sharding import coordinator
+from src.handlers.profile import profile
+from src.utils import profiling
+from src.config import settings
+from src.utils.update_processor import UserOrderedUpdateProcessor
+from src.webhook import serve_webhook
+
+
+async def close_api(application) -> None:
+    # Guardar los cambios pendientes y cerrar las conexiones compartidas con la API al apagar el bot
+    await writer.close()
+    await api.close()
+    await coordinator.stop_workers()
+
 
 # Configuración del bot
 def start_bot():
 
     # Crear la aplicación del bot
-    application = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    # Los updates de usuarios distintos se atienden en paralelo; los de un mismo usuario, en orden
+    processor = UserOrderedUpdateProcessor(settings.BOT_CONCURRENT_UPDATES, settings.BOT_MAX_PENDING_UPDATES)
+    application = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(processor)
+        .post_shutdown(close_api)
+        .build()
+    )
+
+    # Control de acceso antes de cualquier manejador (grupo -1); corta el update si se deniega
+    application.add_handler(TypeHandler(Update, access_guard), group=-1)
 
     # Agregar el comando /start
     application.add_handler(CommandHandler("start", start))
@@ -31,6 +60,9 @@ def start_bot():
     # Agregar el comando /redirection
     application.add_handler(CommandHandler("redirection", redirection))
 
+    # Comando de administración para el perfilado bajo demanda
+    application.add_handler(CommandHandler("profile", profile))
+
     # Agregar los manejadores de callback con los patrones correctos
     application.add_handler(CallbackQueryHandler(handle_callback_query, pattern='^(connect|chats)$'))
     application.add_handler(CallbackQueryHandler(handle_back, pattern='^back$'))
@@ -40,7 +72,14 @@ def start_bot():
 
     application.add_handler(CallbackQueryHandler(handle_callback_query))
 
+    # Medir el tiempo de cada manejador cuando se active /profile
+    profiling.instrument_application(application)
+
     # Iniciar el bot
+    if settings.BOT_MODE == "webhook":
+        # Mismo bucle de eventos que las tareas de Telethon creadas en main.py
+        asyncio.get_event_loop().run_until_complete(serve_webhook(application))
+        return
     print("El bot está ejecutándose...")
     application.run_polling()
 
@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import aiohttp
+
+from ..config import settings
+from ..utils.metrics import Counter, Histogram
+
+api_latency = Histogram("bot_api_request_seconds", "Duración de las solicitudes a la API", ("endpoint",))
+api_errors_total = Counter("bot_api_errors_total", "Solicitudes a la API fallidas o con error HTTP", ("endpoint",))
+
+
+class ApiError(Exception):
+    """Error de transporte al comunicarse con la API (conexión, timeout)."""
+
+
+class ApiClient:
+    """
+    Cliente HTTP compartido para la API REST (`URL_API`).
+    Mantiene una única `aiohttp.ClientSession` con conexiones keep-alive reutilizables,
+    creada en el primer uso para quedar asociada al bucle de eventos en ejecución.
+    """
+
+    def __init__(self, base_url: str, api_key: str, timeout: float = 10, pool_size: int = 20):
+        self.base_url = (base_url or "").rstrip("/")
+        self.headers = {
+            "apikey": api_key or "",
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.pool_size = pool_size
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector, headers=self.headers, timeout=self.timeout
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def post(self, path: str, payload=None) -> tuple:
+        """
+        Realiza un POST y devuelve `(status, cuerpo)`; el cuerpo es JSON si la respuesta lo es, o texto.
+        """
+        url = f"{self.base_url}/{path}" if path else self.base_url
+        endpoint = path or "/"
+        started = time.monotonic()
+        try:
+            async with self._get_session().post(url, json=payload) as response:
+                if response.content_type == "application/json":
+                    body = await response.json()
+                else:
+                    body = await response.text()
+                if response.status >= 400:
+                    api_errors_total.inc(endpoint)
+                return response.status, body
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            api_errors_total.inc(endpoint)
+            raise ApiError(f"{path or url}: {str(e) or type(e).__name__}") from e
+        finally:
+            api_latency.observe(time.monotonic() - started, endpoint)
+
+    async def rpc(self, name: str, payload=None) -> tuple:
+        return await self.post(f"rpc/{name}", payload)
+
+    async def get_session_data(self, user_id: int) -> dict | None:
+        status, data = await self.post("", {"user_id": user_id})
+        if status != 200:
+            print(f"Error: {status} - {data}")
+            return None
+        return data or None
+
+    async def get_all_redirections(self) -> list | None:
+        status, data = await self.rpc("get_all_redirections")
+        if status != 200:
+            print(f"Error al cargar redirecciones: {status}")
+            return None
+        return data
+
+    async def get_redirection_changes(self, since: str | None) -> list | None:
+        """
+        Redirecciones creadas, modificadas o borradas desde `since` (`updated_at` de la última
+        fila vista, inclusive, porque volver a aplicar una fila no cambia nada; None para todas).
+        Las borradas llegan con `deleted` en true. Es una función nueva de la API: sin
+        `updated_at` cada consulta devuelve la tabla entera y sin `deleted` no se ven los borrados.
+        """
+        status, data = await self.rpc("get_redirection_changes", {"p_since": since})
+        if status != 200:
+            print(f"Error al sincronizar redirecciones: {status}")
+            return None
+        return data
+
+    async def insert_redirection(self, user_id: int, redirection_id: str) -> int:
+        status, _ = await self.rpc("insert_redirection", {
+            "user_id": str(user_id),
+            "redirection_id": redirection_id
+        })
+        return status
+
+    async def insert_chats_redirection(self, user_id: int, redirection_id: str, chat_id: int, role: str) -> int:
+        status, _ = await self.rpc("insert_chats_redirection", {
+            "p_chat_id": str(chat_id),
+            "p_role": role,
+            "p_user_id": str(user_id),
+            "p_redirection_id": f"{user_id}_{redirection_id}",
+        })
+        return status
+
+    async def upsert_redirections(self, redirections: list) -> int:
+        """
+        Crea o actualiza varias redirecciones en una sola solicitud.
+        Cada elemento: `{"user_id", "redirection_id", "source_chat_id", "destination_chat_id"}`;
+        los chats nulos no modifican el valor guardado. Las API sin esta función responden 404.
+        """
+        status, _ = await self.rpc("upsert_redirections", {"p_redirections": redirections})
+        return status
+
+    async def delete_redirection(self, user_id: int, redirection_id: str) -> int:
+        status, _ = await self.rpc("delete_redirection", {
+            "redirection_id_input": redirection_id,
+            "user_id_input": str(user_id),
+        })
+        return status
+
+    async def get_user_by_id(self, user_id: int) -> tuple:
+        return await self.rpc("get_user_by_id", {"user_id_input": user_id})
+
+    async def create_user(self, user_data: dict) -> tuple:
+        return await self.rpc("create_user", {"user_data": user_data})
+
+
+# Cliente compartido por toda la aplicación
+api = ApiClient(settings.URL_API, settings.API_KEY, settings.API_TIMEOUT, settings.API_POOL_SIZE)
@@ -1,87 +1,207 @@
 # src/client_manager.py
-import os
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict
 
-import aiohttp
 from telethon import TelegramClient
 
-from ..config.settings import API_ID, API_HASH, URL_API, API_KEY, SESSION_PATH
+from .api_client import api
+from .session_store import session_store
+from ..utils.metrics import Gauge
+from ..config.settings import API_ID, API_HASH, MAX_CLIENTS, CLIENT_IDLE_TIMEOUT
 
-# Diccionario global para almacenar clientes por usuario
-clients = {}
+# Diccionario global para almacenar clientes por usuario, ordenado del menos al más usado (LRU)
+clients = OrderedDict()
 
 event_handlers = {}
 
+# Estado del pool: bloqueos por usuario `[lock, tareas que lo usan]`, usos en curso,
+# clientes conectándose y último uso
+_locks = {}
+in_use = {}
+connecting = set()
+last_used = {}
+
+
+@contextlib.asynccontextmanager
+async def _user_lock(user_id: int):
+    # El bloqueo se borra cuando ninguna tarea lo tiene ni lo espera
+    entry = _locks.get(user_id)
+    if entry is None:
+        entry = _locks[user_id] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _locks[user_id]
+
+
+def _touch(user_id: int) -> None:
+    clients.move_to_end(user_id)
+    last_used[user_id] = time.monotonic()
+
+
+def _is_evictable(user_id: int) -> bool:
+    # Solo se cierran clientes sin redirecciones activas, sin usos en curso y sin operaciones del pool pendientes
+    return user_id not in event_handlers and user_id not in in_use and user_id not in _locks
+
+
+def retain(user_id: int) -> None:
+    """Marca el cliente del usuario como en uso; no se cierra hasta el `release` correspondiente."""
+    in_use[user_id] = in_use.get(user_id, 0) + 1
+
+
+def release(user_id: int) -> None:
+    count = in_use.get(user_id, 0) - 1
+    if count > 0:
+        in_use[user_id] = count
+    else:
+        in_use.pop(user_id, None)
+    if user_id in clients:
+        last_used[user_id] = time.monotonic()
+
+
+@contextlib.asynccontextmanager
+async def lease(user_id: int):
+    """Cliente del usuario reservado mientras dura el bloque, p. ej. para recorrer sus diálogos."""
+    retain(user_id)
+    try:
+        yield await get_or_create_client(user_id)
+    finally:
+        release(user_id)
+
+
+async def is_authorized(user_id: int) -> bool:
+    """Pregunta a Telegram si la sesión del usuario está autorizada, con el cliente de este proceso."""
+    async with lease(user_id) as client:
+        return await client.is_user_authorized()
+
 
 async def get_or_create_client(user_id: int) -> TelegramClient:
     """
     Obtiene o crea un cliente para un usuario específico.
-    Si ya existe un cliente para este usuario, lo reutiliza.
+    Si ya existe un cliente para este usuario, lo reutiliza. El bloqueo por usuario
+    evita abrir dos clientes sobre la misma sesión. Quien use el cliente más allá de
+    esta llamada debe reservarlo con `lease` o `retain` para que no se cierre.
     """
-    if user_id in clients:
-        client = clients[user_id]
-        if not client.is_connected():
-            await client.connect()
+    client = clients.get(user_id)
+    if client is not None and client.is_connected():
+        _touch(user_id)
         return client
 
-    # Si no existe un cliente para este usuario, lo creamos
-    session_name = os.path.join(SESSION_PATH, f"user_{user_id}")
-    client = TelegramClient(str(session_name), API_ID, API_HASH)
+    async with _user_lock(user_id):
+        client = clients.get(user_id)
+        created = client is None
+        if created:
+            await _make_room()
+            # Si no existe un cliente para este usuario, lo creamos con la sesión del almacén configurado.
+            # Se registra antes de conectar para que las creaciones simultáneas cuenten para MAX_CLIENTS
+            client = TelegramClient(session_store.open(user_id), API_ID, API_HASH)
+            clients[user_id] = client
 
-    try:
-        await client.connect()
-    except Exception as e:
-        await client.disconnect()
-        raise Exception(f"Error al conectar el cliente: {str(e)}")
-
-    clients[user_id] = client
-    return client
+        if not client.is_connected():
+            connecting.add(user_id)
+            try:
+                await client.connect()
+            except Exception as e:
+                await client.disconnect()
+                if created:
+                    clients.pop(user_id, None)
+                    last_used.pop(user_id, None)
+                raise Exception(f"Error al conectar el cliente: {str(e)}")
+            finally:
+                connecting.discard(user_id)
+            # Al conectar por primera vez se generan la clave y el DC de la sesión
+            save_session(user_id, client)
+
+        _touch(user_id)
+        return client
 
 
-async def disconnect_client(user_id: int) -> None:
+async def _make_room() -> None:
     """
-    Desconecta el cliente para el usuario específico.
+    Cierra los clientes menos usados sin redirecciones activas ni usos en curso hasta quedar
+    por debajo de MAX_CLIENTS. Los clientes que se están creando ya cuentan en `clients`.
     """
-    if user_id in clients:
-        client = clients[user_id]
-        if client.is_connected():
-            await client.disconnect()
-        del clients[user_id]
+    while len(clients) >= MAX_CLIENTS:
+        victim = next((user_id for user_id in clients if _is_evictable(user_id)), None)
+        if victim is None:
+            print(f"Límite de {MAX_CLIENTS} clientes alcanzado, todos con redirecciones activas o en uso.")
+            return
+        await disconnect_client(victim)
 
-async def get_session_data(user_id: int):
-    async with aiohttp.ClientSession() as session:
-        # El cuerpo de la solicitud POST con el user_id
-        payload = {
-            "user_id": user_id
-        }
-
-        # Definir los encabezados para la solicitud
-        headers = {
-            "Content-Type": "application/json",
-            "apikey": API_KEY,
-            "Authorization": f"Bearer {API_KEY}"
-        }
 
+async def evict_idle_clients() -> int:
+    """
+    Cierra los clientes sin redirecciones activas que no se usan desde hace CLIENT_IDLE_TIMEOUT segundos.
+    """
+    cutoff = time.monotonic() - CLIENT_IDLE_TIMEOUT
+    idle = [user_id for user_id in clients if _is_evictable(user_id) and last_used.get(user_id, 0) < cutoff]
+    evicted = 0
+    for user_id in idle:
+        # Mientras se cerraban los anteriores pudo empezar a usarse
+        if _is_evictable(user_id):
+            await disconnect_client(user_id)
+            evicted += 1
+    return evicted
+
+
+async def run_idle_eviction(interval: float = 60) -> None:
+    while True:
+        await asyncio.sleep(interval)
         try:
-            # Hacer la solicitud POST asincrónica
-            async with session.post(URL_API, json=payload, headers=headers) as response:
-                # Verificar si la respuesta es exitosa
-                if response.status != 200:
-                    print(f"Error: {response.status} - {await response.text()}")
-                    return None
+            evicted = await evict_idle_clients()
+            if evicted:
+                print(f"{evicted} clientes inactivos cerrados.")
+        except Exception as e:
+            print(f"Error al cerrar clientes inactivos: {e}")
 
-                # Obtener el contenido JSON de la respuesta
-                data = await response.json()
 
-                # Verificar si session_data está presente y no es null
-                if not data:
-                    # Si session_data es None, null o vacío, la sesión no está completa
-                    print("Session data is null or empty.")
-                    return None
+def pool_stats() -> dict:
+    """Métricas del pool de clientes."""
+    return {
+        "open": len(clients),
+        "connected": sum(1 for client in clients.values() if client.is_connected()),
+        "connecting": len(connecting),
+        "in_use": len(in_use),
+        "idle": sum(1 for user_id in clients if user_id not in event_handlers),
+        "max": MAX_CLIENTS,
+    }
 
-                # Retornar los datos de la sesión
-                return data
 
-        except Exception as e:
-            # Manejar errores durante la solicitud
-            print(f"Error al obtener sesión para el usuario {user_id}: {e}")
-            return None
+Gauge("bot_telegram_clients", "Clientes de Telethon en el pool por estado", ("state",),
+      collect=lambda: {(state,): value for state, value in pool_stats().items()})
+
+
+def save_session(user_id: int, client: TelegramClient) -> None:
+    """Guarda la sesión del cliente en el almacén, p. ej. tras iniciar sesión o cambiar de DC."""
+    try:
+        session_store.save(user_id, client.session)
+    except Exception as e:
+        print(f"Error al guardar la sesión del usuario {user_id}: {e}")
+
+
+async def disconnect_client(user_id: int) -> None:
+    """
+    Desconecta el cliente para el usuario específico.
+    """
+    async with _user_lock(user_id):
+        client = clients.pop(user_id, None)
+        last_used.pop(user_id, None)
+        if client is not None:
+            save_session(user_id, client)
+            if client.is_connected():
+                await client.disconnect()
+
+async def get_session_data(user_id: int):
+    try:
+        # Retornar los datos de la sesión, o None si la sesión no está completa
+        return await api.get_session_data(user_id)
+    except Exception as e:
+        # Manejar errores durante la solicitud
+        print(f"Error al obtener sesión para el usuario {user_id}: {e}")
+        return None
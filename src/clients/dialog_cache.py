@@ -0,0 +1,85 @@
+import time
+import weakref
+
+from telethon.tl.types import Chat, User, Channel
+
+from ..config import settings
+
+
+def classify(entity) -> tuple | None:
+    """
+    Devuelve `(categoría, nombre, id)` de un chat; la categoría es "user", "bot", "channel" o "group".
+    """
+    if isinstance(entity, User):
+        if entity.bot:
+            return "bot", entity.first_name or "", entity.id
+        return "user", f"{entity.first_name or ''} {entity.last_name or ''}", entity.id
+    if isinstance(entity, Chat):
+        return "group", entity.title or "", entity.id
+    if isinstance(entity, Channel):
+        return "channel", entity.title or "", entity.id
+    return None
+
+
+class DialogCache:
+    """
+    Caché por usuario de la lista de chats (`id marcado -> (categoría, nombre, id)`).
+
+    La lista completa se descarga como mucho una vez cada `ttl` segundos; entre
+    descargas se añaden los chats nuevos que ve el manejador de mensajes del
+    enrutador. Los cambios de título y las salidas se reflejan en la siguiente descarga.
+    """
+
+    def __init__(self, ttl: float = 600):
+        self.ttl = ttl
+        self.entries = {}
+
+    def get(self, user_id: int, client=None) -> dict | None:
+        entry = self.entries.get(user_id)
+        if entry is None or time.monotonic() - entry["fetched_at"] > self.ttl:
+            return None
+        # Si el cliente se cerró y se volvió a crear, la entrada es de la sesión anterior
+        if client is not None and entry["client"]() is not client:
+            return None
+        return entry["dialogs"]
+
+    async def get_or_load(self, user_id: int, client) -> dict:
+        async for _ in self.iter(user_id, client):
+            pass
+        return self.entries[user_id]["dialogs"]
+
+    async def iter(self, user_id: int, client):
+        """
+        Recorre los chats `(categoría, nombre, id)` a medida que llegan.
+        Si la caché no es reciente, los descarga con `iter_dialogs` y la rellena al terminar.
+        """
+        dialogs = self.get(user_id, client)
+        if dialogs is not None:
+            for info in list(dialogs.values()):
+                yield info
+            return
+
+        dialogs = {}
+        async for dialog in client.iter_dialogs():
+            info = classify(dialog.entity)
+            if info is not None:
+                dialogs[dialog.id] = info
+                yield info
+        self.store(user_id, client, dialogs)
+
+    def store(self, user_id: int, client, dialogs: dict) -> None:
+        """Guarda una lista completa de chats."""
+        self.entries[user_id] = {"dialogs": dialogs, "fetched_at": time.monotonic(), "client": weakref.ref(client)}
+
+    def observe(self, user_id: int, event) -> None:
+        """Añade el chat de un mensaje nuevo si aún no está en la lista; sin llamadas a Telegram."""
+        dialogs = self.entries.get(user_id, {}).get("dialogs")
+        if dialogs is None or event.chat_id in dialogs or event.chat is None:
+            return
+        info = classify(event.chat)
+        if info is not None:
+            dialogs[event.chat_id] = info
+
+
+# Caché compartida por toda la aplicación
+dialog_cache = DialogCache(settings.DIALOG_CACHE_TTL)
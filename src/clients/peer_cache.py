@@ -0,0 +1,130 @@
+from telethon import utils
+from telethon.tl import types
+
+from .snapshot import snapshot
+
+# Tipos de InputPeer que se pueden guardar como `(tipo, access_hash)`
+PEER_KINDS = {
+    types.InputPeerUser: "user",
+    types.InputPeerChat: "chat",
+    types.InputPeerChannel: "channel",
+    types.InputPeerSelf: "self",
+}
+
+
+def chat_keys(chat_id: int) -> set:
+    """
+    Devuelve los IDs marcados con los que Telethon identifica un chat.
+    Un ID positivo puede ser usuario, grupo o canal, igual que el filtro `chats=` de Telethon.
+    """
+    chat_id = int(chat_id)
+    if chat_id < 0:
+        return {chat_id}
+    return {
+        utils.get_peer_id(types.PeerUser(chat_id)),
+        utils.get_peer_id(types.PeerChat(chat_id)),
+        utils.get_peer_id(types.PeerChannel(chat_id)),
+    }
+
+
+def peer_key(peer) -> int | str:
+    """ID marcado de un InputPeer; el propio usuario no tiene ID en el InputPeer."""
+    if isinstance(peer, types.InputPeerSelf):
+        return "self"
+    return utils.get_peer_id(peer)
+
+
+def index_keys(peer, chat_id: int) -> set:
+    """IDs con los que llegan los eventos de un chat: el exacto si ya está resuelto, si no todos los posibles."""
+    if isinstance(peer, (types.InputPeerUser, types.InputPeerChat, types.InputPeerChannel)):
+        return {utils.get_peer_id(peer)}
+    return chat_keys(chat_id)
+
+
+def build_peer(chat_id: int, kind: str, access_hash: int | None):
+    real_id = utils.resolve_id(chat_id)[0] if chat_id < 0 else chat_id
+    if kind == "user":
+        return types.InputPeerUser(real_id, access_hash)
+    if kind == "chat":
+        return types.InputPeerChat(real_id)
+    if kind == "channel":
+        return types.InputPeerChannel(real_id, access_hash)
+    if kind == "self":
+        return types.InputPeerSelf()
+    return None
+
+
+class PeerCache:
+    """
+    InputPeers ya resueltos por cuenta, indexados por el ID de chat tal como está configurado.
+
+    Se resuelven una vez al iniciar la redirección y se guardan en la copia local (tabla
+    `peers`), así los envíos no dependen de la caché de entidades de Telethon, que con las
+    sesiones en memoria empieza vacía en cada arranque.
+    """
+
+    def __init__(self, store=snapshot):
+        self.store = store
+        self.peers = {}
+
+    def _account(self, user_id: int) -> dict:
+        peers = self.peers.get(user_id)
+        if peers is None:
+            peers = self.peers[user_id] = {}
+            try:
+                saved = self.store.load_peers(user_id)
+            except Exception as e:
+                print(f"Error al leer los peers guardados del usuario {user_id}: {str(e)}")
+                saved = {}
+            for chat_id, (kind, access_hash) in saved.items():
+                peer = build_peer(chat_id, kind, access_hash)
+                if peer is not None:
+                    peers[chat_id] = peer
+        return peers
+
+    async def resolve(self, user_id: int, client, chat_ids) -> dict:
+        """
+        Devuelve `{chat_id: InputPeer}`. Los que faltan se piden a Telethon y, si no los
+        conoce, se buscan una sola vez en la lista de chats de la cuenta. Los chats a los
+        que la cuenta no tiene acceso no aparecen en el resultado.
+        """
+        peers = self._account(user_id)
+        missing = [chat_id for chat_id in dict.fromkeys(int(chat_id) for chat_id in chat_ids) if chat_id not in peers]
+        resolved = {}
+
+        unresolved = []
+        for chat_id in missing:
+            try:
+                resolved[chat_id] = await client.get_input_entity(chat_id)
+            except (ValueError, TypeError):
+                unresolved.append(chat_id)
+
+        if unresolved:
+            # Telethon aún no ha visto esos chats: recorrer los diálogos trae sus access_hash
+            wanted = {}
+            for chat_id in unresolved:
+                for marked in chat_keys(chat_id):
+                    wanted.setdefault(marked, []).append(chat_id)
+            async for dialog in client.iter_dialogs():
+                for chat_id in wanted.get(utils.get_peer_id(dialog.entity), ()):
+                    resolved.setdefault(chat_id, utils.get_input_peer(dialog.entity))
+                if len(resolved) == len(missing):
+                    break
+
+        peers.update(resolved)
+        self.save(user_id, resolved)
+        return {int(chat_id): peers[int(chat_id)] for chat_id in chat_ids if int(chat_id) in peers}
+
+    def save(self, user_id: int, peers: dict) -> None:
+        rows = {
+            chat_id: (PEER_KINDS[type(peer)], getattr(peer, "access_hash", None))
+            for chat_id, peer in peers.items() if type(peer) in PEER_KINDS
+        }
+        try:
+            self.store.save_peers(user_id, rows)
+        except Exception as e:
+            print(f"Error al guardar los peers del usuario {user_id}: {str(e)}")
+
+
+# Caché compartida por todo el proceso
+peer_cache = PeerCache()
@@ -0,0 +1,158 @@
+import asyncio
+
+from .api_client import api, ApiError
+from ..config import settings
+
+
+class RedirectionWriter:
+    """
+    Buffer de escritura diferida para la configuración de redirecciones.
+
+    Los cambios se agrupan por (usuario, redirección), quedándose con la versión más
+    reciente, y se envían juntos con `rpc/upsert_redirections` tras `delay` segundos.
+    Si la API falla por un error transitorio (conexión, 408, 429 o 5xx), los cambios
+    vuelven al buffer y se reintentan con espera exponencial hasta `max_retries` veces;
+    los demás errores HTTP no se arreglan reintentando y el lote se descarta.
+
+    Si la API aún no tiene `upsert_redirections` (404), se guardan fila a fila con los
+    endpoints anteriores `insert_redirection` e `insert_chats_redirection`.
+    """
+
+    def __init__(self, client, delay: float = 0.5, max_batch: int = 100, max_retries: int = 8,
+                 max_backoff: float = 60):
+        self.client = client
+        self.delay = delay
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.pending = {}
+        self.failures = 0
+        self.legacy = False
+        self._timer = None
+        # Un solo envío a la vez; `_inflight` son las claves que viajan en el envío en curso
+        self._lock = asyncio.Lock()
+        self._inflight = set()
+
+    def put(self, user_id: int, redirection_id: str, source: int | None = None,
+            destination: int | None = None) -> None:
+        key = (user_id, redirection_id)
+        row = self.pending.get(key) or {"user_id": str(user_id), "redirection_id": redirection_id,
+                                        "source_chat_id": None, "destination_chat_id": None}
+        if source is not None:
+            row["source_chat_id"] = str(source)
+        if destination is not None:
+            row["destination_chat_id"] = str(destination)
+        self.pending[key] = row
+        self._schedule(self.delay)
+
+    def discard(self, user_id: int, redirection_id: str) -> bool:
+        """Descarta un cambio pendiente; devuelve True si existía."""
+        return self.pending.pop((user_id, redirection_id), None) is not None
+
+    async def discard_settled(self, user_id: int, redirection_id: str) -> bool:
+        """
+        Como `discard`, pero si la redirección viaja en un envío en curso espera a que
+        termine, para que ese upsert no llegue a la API después de un borrado.
+        """
+        key = (user_id, redirection_id)
+        pending = self.discard(user_id, redirection_id)
+        while key in self._inflight:
+            async with self._lock:
+                pass
+            # Si el envío falló, el cambio volvió al buffer
+            pending = self.discard(user_id, redirection_id) or pending
+        return pending
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self.pending:
+                return
+
+            batch, self.pending = self.pending, {}
+            items = list(batch.items())
+            self._inflight = set(batch)
+            try:
+                for start in range(0, len(items), self.max_batch):
+                    chunk = items[start:start + self.max_batch]
+                    if await self._send(chunk):
+                        continue
+
+                    self.failures += 1
+                    if self.failures > self.max_retries:
+                        print(f"Se descartan {len(items) - start} cambios de redirecciones tras "
+                              f"{self.max_retries} reintentos fallidos.")
+                        self.failures = 0
+                        return
+
+                    # Devolver al buffer los cambios no guardados sin pisar los más recientes
+                    for key, row in items[start:]:
+                        newer = self.pending.get(key, {})
+                        self.pending[key] = {**row, **{field: value for field, value in newer.items()
+                                                       if value is not None}}
+                    self._schedule(min(self.delay * 2 ** self.failures, self.max_backoff))
+                    return
+            finally:
+                self._inflight = set()
+
+    async def _send(self, chunk: list) -> bool:
+        """Envía un lote; devuelve False si hay que reintentarlo."""
+        rows = [row for _, row in chunk]
+        try:
+            status = None
+            if not self.legacy:
+                status = await self.client.upsert_redirections(rows)
+                if status == 404:
+                    print("La API no tiene rpc/upsert_redirections; se usan los endpoints anteriores.")
+                    self.legacy = True
+            if self.legacy:
+                status = await self._send_legacy(rows)
+        except ApiError as e:
+            print(f"Error al hacer la solicitud a la API: {str(e)}")
+            return False
+
+        if status in (200, 201, 204):
+            print(f"{len(chunk)} redirecciones guardadas correctamente en la base de datos.")
+            self.failures = 0
+            return True
+        if status in (408, 429) or status >= 500:
+            print(f"Error al guardar redirecciones: {status}")
+            return False
+        print(f"Error no recuperable al guardar redirecciones ({status}); se descartan {len(chunk)} cambios.")
+        return True
+
+    async def _send_legacy(self, rows: list) -> int:
+        """Guarda las filas una a una con los endpoints anteriores; devuelve el primer estado de error."""
+        for row in rows:
+            user_id, redirection_id = int(row["user_id"]), row["redirection_id"]
+            status = await self.client.insert_redirection(user_id, redirection_id)
+            # 409: ya existía, p. ej. creada con /redirection add en un envío anterior
+            if status not in (200, 201, 204, 409):
+                return status
+            for role, field in (("source", "source_chat_id"), ("destination", "destination_chat_id")):
+                if row[field] is None:
+                    continue
+                status = await self.client.insert_chats_redirection(user_id, redirection_id, row[field], role)
+                if status not in (200, 201, 204):
+                    return status
+        return 204
+
+    async def close(self) -> None:
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        await self.flush()
+
+
+# Buffer compartido por toda la aplicación
+writer = RedirectionWriter(
+    api, settings.WRITE_BEHIND_DELAY, settings.WRITE_BEHIND_BATCH,
+    settings.WRITE_BEHIND_MAX_RETRIES, settings.WRITE_BEHIND_MAX_BACKOFF,
+)
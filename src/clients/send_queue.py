@@ -0,0 +1,182 @@
+import asyncio
+import time
+
+from telethon.errors import FloodWaitError
+
+from ..utils.metrics import Counter, Histogram
+
+send_latency = Histogram(
+    "bot_send_latency_seconds", "Tiempo desde que se encola un envío hasta que Telegram responde", ("method",)
+)
+flood_waits_total = Counter("bot_flood_waits_total", "FloodWait recibidos de Telegram", ("account",))
+flood_wait_seconds_total = Counter("bot_flood_wait_seconds_total", "Segundos de espera por FloodWait", ("account",))
+send_dropped_total = Counter("bot_send_dropped_total", "Envíos descartados por tener la cola del destino llena",
+                             ("account",))
+
+
+class SendQueueFull(Exception):
+    """La cola del destino está llena y el envío se descarta."""
+
+
+class TokenBucket:
+    """
+    Limitador de tasa tipo token bucket.
+    `rate` tokens por segundo con ráfagas de hasta `capacity` tokens.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """Bloquea el bucket, por ejemplo tras un FloodWait de Telegram."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SendQueue:
+    """
+    Cola de envíos salientes de una cuenta de Telegram.
+
+    Cada destino tiene su propia cola FIFO, atendida por una tarea que respeta el
+    límite por chat y el límite global de la cuenta. Ante un `FloodWaitError` se
+    pausa toda la cuenta el tiempo indicado por Telegram y se reintenta la misma
+    operación, de modo que el orden de los mensajes por destino se mantiene.
+    Con `max_queue` cada destino admite como mucho esa cantidad de envíos pendientes;
+    los que llegan con la cola llena se descartan con `SendQueueFull`.
+    """
+
+    def __init__(self, rate_per_chat: float = 1.0, burst_per_chat: float = 3,
+                 rate_per_account: float = 25.0, burst_per_account: float = 30,
+                 max_retries: int = 5, max_flood_wait: int = 300, idle_timeout: float = 60, max_queue: int = 0,
+                 account=""):
+        self.account = str(account)
+        self.rate_per_chat = rate_per_chat
+        self.burst_per_chat = burst_per_chat
+        self.account_bucket = TokenBucket(rate_per_account, burst_per_account)
+        self.max_retries = max_retries
+        self.max_flood_wait = max_flood_wait
+        self.idle_timeout = idle_timeout
+        self.max_queue = max_queue
+        self.queues = {}
+        self.buckets = {}
+        self.workers = {}
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0
+        self.dropped = 0
+
+    async def submit(self, destination, func, *args, **kwargs):
+        """
+        Encola `func(*args, **kwargs)` para el destino indicado y espera su resultado.
+        """
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        queue = self.queues.get(destination)
+        if queue is None:
+            queue = self.queues[destination] = asyncio.Queue(self.max_queue)
+            self.buckets[destination] = TokenBucket(self.rate_per_chat, self.burst_per_chat)
+        try:
+            queue.put_nowait((future, func, args, kwargs))
+        except asyncio.QueueFull:
+            # Un origen muy activo no debe hacer crecer la memoria sin límite
+            self.dropped += 1
+            send_dropped_total.inc(self.account)
+            raise SendQueueFull(f"Cola de envíos llena para el destino {destination}")
+
+        if destination not in self.workers:
+            self.workers[destination] = asyncio.create_task(self._worker(destination))
+        try:
+            return await future
+        finally:
+            send_latency.observe(time.monotonic() - started, getattr(func, "__name__", "call"))
+
+    def depth(self) -> dict:
+        """Cantidad de operaciones pendientes por destino."""
+        return {destination: queue.qsize() for destination, queue in self.queues.items()}
+
+    async def close(self) -> None:
+        for worker in self.workers.values():
+            worker.cancel()
+        await asyncio.gather(*self.workers.values(), return_exceptions=True)
+        self.workers.clear()
+
+    async def _worker(self, destination) -> None:
+        queue = self.queues[destination]
+        bucket = self.buckets[destination]
+        try:
+            while True:
+                try:
+                    future, func, args, kwargs = await asyncio.wait_for(queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if queue.empty():
+                        # Liberar los recursos de destinos inactivos
+                        del self.queues[destination]
+                        del self.buckets[destination]
+                        return
+                    continue
+
+                if future.cancelled():
+                    continue
+
+                try:
+                    result = await self._call(bucket, func, args, kwargs)
+                except asyncio.CancelledError as e:
+                    # Solo se detiene el worker si lo cancelaron a él; si fue la operación, se sigue con la cola.
+                    # `Task.cancelling()` requiere Python 3.11 o superior
+                    if asyncio.current_task().cancelling():
+                        raise
+                    if not future.done():
+                        future.set_exception(e)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            # Un worker terminado no debe quedar registrado: el siguiente envío inicia otro
+            if self.workers.get(destination) is asyncio.current_task():
+                del self.workers[destination]
+            # Si la tarea se cancela, no dejar operaciones esperando indefinidamente
+            while not queue.empty():
+                future = queue.get_nowait()[0]
+                if not future.done():
+                    future.cancel()
+
+    async def _call(self, bucket: TokenBucket, func, args, kwargs):
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            await self.account_bucket.acquire()
+            try:
+                return await func(*args, **kwargs)
+            except FloodWaitError as e:
+                attempt += 1
+                if attempt > self.max_retries or e.seconds > self.max_flood_wait:
+                    raise
+
+                self.flood_waits += 1
+                self.flood_wait_seconds += e.seconds
+                flood_waits_total.inc(self.account)
+                flood_wait_seconds_total.inc(self.account, amount=e.seconds)
+                print(f"FloodWait de {e.seconds}s, reintentando ({attempt}/{self.max_retries})...")
+                # El FloodWait de envío suele aplicarse a toda la cuenta, no solo a este destino
+                bucket.pause(e.seconds)
+                self.account_bucket.pause(e.seconds)
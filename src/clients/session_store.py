@@ -0,0 +1,285 @@
+import hashlib
+import hmac
+import os
+import re
+import sqlite3
+import time
+
+import pyaes
+from telethon.sessions import Session, SQLiteSession, StringSession
+
+from ..config import settings
+
+SESSION_FILE_PATTERN = re.compile(r"^user_(\d+)\.session$")
+
+
+class SessionCipher:
+    """
+    Cifra las cadenas de sesión con AES-256-CTR y las autentica con HMAC-SHA256.
+
+    Las dos claves se derivan de `secret`; sin la misma clave no se puede leer ni
+    modificar una sesión guardada.
+    """
+
+    VERSION = b"\x01"
+
+    def __init__(self, secret: str):
+        if not secret:
+            raise ValueError("Se necesita SESSION_KEY para cifrar las sesiones.")
+        key = hashlib.pbkdf2_hmac("sha256", secret.encode(), b"bot_reenvio-sessions", 200_000, 64)
+        self._key, self._mac_key = key[:32], key[32:]
+
+    def encrypt(self, data: str) -> bytes:
+        nonce = os.urandom(16)
+        ciphertext = pyaes.AESModeOfOperationCTR(self._key, pyaes.Counter(int.from_bytes(nonce, "big"))).encrypt(
+            data.encode())
+        payload = self.VERSION + nonce + ciphertext
+        return payload + hmac.new(self._mac_key, payload, hashlib.sha256).digest()
+
+    def decrypt(self, blob: bytes) -> str:
+        payload, tag = blob[:-32], blob[-32:]
+        if payload[:1] != self.VERSION or not hmac.compare_digest(
+                tag, hmac.new(self._mac_key, payload, hashlib.sha256).digest()):
+            raise ValueError("Sesión cifrada dañada o clave incorrecta.")
+        nonce, ciphertext = payload[1:17], payload[17:]
+        return pyaes.AESModeOfOperationCTR(self._key, pyaes.Counter(int.from_bytes(nonce, "big"))).decrypt(
+            ciphertext).decode()
+
+
+class SessionStore:
+    """
+    Almacén de sesiones de Telethon por usuario.
+
+    `open` devuelve la sesión con la que se crea el cliente y `save` la guarda de
+    nuevo tras conectar o iniciar sesión, que es cuando cambian la clave y el DC.
+    """
+
+    def open(self, user_id: int) -> Session:
+        raise NotImplementedError
+
+    def save(self, user_id: int, session: Session) -> None:
+        raise NotImplementedError
+
+    def exists(self, user_id: int) -> bool:
+        raise NotImplementedError
+
+    def delete(self, user_id: int) -> None:
+        raise NotImplementedError
+
+    def user_ids(self) -> list:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class FileSessionStore(SessionStore):
+    """Un archivo SQLite `user_{id}.session` por usuario, el formato nativo de Telethon."""
+
+    def __init__(self, directory: str):
+        self.directory = directory or "."
+
+    def path(self, user_id: int) -> str:
+        return os.path.join(self.directory, f"user_{user_id}.session")
+
+    def open(self, user_id: int) -> Session:
+        return SQLiteSession(self.path(user_id))
+
+    def save(self, user_id: int, session: Session) -> None:
+        session.save()
+
+    def exists(self, user_id: int) -> bool:
+        return os.path.exists(self.path(user_id))
+
+    def delete(self, user_id: int) -> None:
+        # El archivo y los auxiliares de SQLite, sin tocar p. ej. un `.session.enc` del mismo usuario
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            try:
+                os.remove(self.path(user_id) + suffix)
+            except FileNotFoundError:
+                pass
+
+    def user_ids(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        matches = (SESSION_FILE_PATTERN.match(name) for name in os.listdir(self.directory))
+        return sorted(int(match.group(1)) for match in matches if match)
+
+
+class StringSessionStore(SessionStore):
+    """
+    Base de los almacenes que guardan la sesión como cadena de `StringSession`.
+
+    El cliente trabaja con la sesión en memoria, sin archivo abierto por cuenta.
+    Solo se escribe cuando la cadena cambia respecto a la última guardada.
+    """
+
+    def __init__(self):
+        self._saved = {}
+
+    def open(self, user_id: int) -> Session:
+        data = self.read(user_id)
+        self._saved[user_id] = data or ""
+        return StringSession(data or None)
+
+    def save(self, user_id: int, session: Session) -> None:
+        data = StringSession.save(session) or ""
+        if self._saved.get(user_id) == data:
+            return
+        if data:
+            self.write(user_id, data)
+        else:
+            self.delete(user_id)
+        self._saved[user_id] = data
+
+    def read(self, user_id: int) -> str | None:
+        raise NotImplementedError
+
+    def write(self, user_id: int, data: str) -> None:
+        raise NotImplementedError
+
+
+class DatabaseSessionStore(StringSessionStore):
+    """
+    Todas las sesiones en una sola base SQLite local, opcionalmente cifradas.
+
+    Los usuarios con sesión se cargan una vez en memoria, así `exists` es una
+    consulta a un conjunto en lugar de tocar el sistema de archivos.
+    Varios procesos pueden compartir la base (modo WAL).
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        user_id INTEGER PRIMARY KEY,
+        data BLOB NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: str, cipher: SessionCipher | None = None):
+        super().__init__()
+        self.path = path
+        self.cipher = cipher
+        self._db = None
+        self._users = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(self.SCHEMA)
+            os.chmod(self.path, 0o600)
+        return self._db
+
+    def _known(self) -> set:
+        if self._users is None:
+            self._users = {user_id for user_id, in self._connect().execute("SELECT user_id FROM sessions")}
+        return self._users
+
+    def read(self, user_id: int) -> str | None:
+        # Siempre se consulta la base: otro proceso (p. ej. un worker) puede haber guardado la sesión
+        row = self._connect().execute("SELECT data FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            self._known().discard(user_id)
+            return None
+        self._known().add(user_id)
+        return self.cipher.decrypt(row[0]) if self.cipher else row[0].decode()
+
+    def write(self, user_id: int, data: str) -> None:
+        blob = self.cipher.encrypt(data) if self.cipher else data.encode()
+        db = self._connect()
+        with db:
+            db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (user_id, blob, time.time()))
+        self._known().add(user_id)
+
+    def exists(self, user_id: int) -> bool:
+        if user_id in self._known():
+            return True
+        # Sesiones creadas por otro proceso desde la carga inicial
+        row = self._connect().execute("SELECT 1 FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        if row is not None:
+            self._known().add(user_id)
+        return row is not None
+
+    def delete(self, user_id: int) -> None:
+        db = self._connect()
+        with db:
+            db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+        self._known().discard(user_id)
+        self._saved.pop(user_id, None)
+
+    def user_ids(self) -> list:
+        return sorted(self._known())
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class EncryptedFileSessionStore(StringSessionStore):
+    """
+    Un archivo cifrado `user_{id}.session.enc` por usuario. El archivo solo se abre
+    al leer o guardar la sesión; el cliente no mantiene ningún descriptor abierto.
+    """
+
+    def __init__(self, directory: str, cipher: SessionCipher):
+        super().__init__()
+        self.directory = directory or "."
+        self.cipher = cipher
+
+    def path(self, user_id: int) -> str:
+        return os.path.join(self.directory, f"user_{user_id}.session.enc")
+
+    def read(self, user_id: int) -> str | None:
+        try:
+            with open(self.path(user_id), "rb") as file:
+                return self.cipher.decrypt(file.read())
+        except FileNotFoundError:
+            return None
+
+    def write(self, user_id: int, data: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(user_id)
+        # Escritura atómica para no dejar una sesión a medias si el proceso se detiene
+        temporary = f"{path}.tmp"
+        descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(self.cipher.encrypt(data))
+        os.replace(temporary, path)
+
+    def exists(self, user_id: int) -> bool:
+        return os.path.exists(self.path(user_id))
+
+    def delete(self, user_id: int) -> None:
+        try:
+            os.remove(self.path(user_id))
+        except FileNotFoundError:
+            pass
+        self._saved.pop(user_id, None)
+
+    def user_ids(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        pattern = re.compile(r"^user_(\d+)\.session\.enc$")
+        matches = (pattern.match(name) for name in os.listdir(self.directory))
+        return sorted(int(match.group(1)) for match in matches if match)
+
+
+def create_store(backend: str) -> SessionStore:
+    """Crea el almacén indicado: "file" (por defecto), "sqlite" o "encrypted"."""
+    if backend == "file":
+        return FileSessionStore(settings.SESSION_PATH)
+    if backend == "sqlite":
+        cipher = SessionCipher(settings.SESSION_KEY) if settings.SESSION_KEY else None
+        return DatabaseSessionStore(settings.SESSION_DB_PATH, cipher)
+    if backend == "encrypted":
+        return EncryptedFileSessionStore(settings.SESSION_PATH, SessionCipher(settings.SESSION_KEY))
+    raise ValueError(f"SESSION_BACKEND desconocido: {backend}")
+
+
+# Almacén compartido por todo el proceso
+session_store = create_store(settings.SESSION_BACKEND)
@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+
+from ..config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS redirections (
+    user_id INTEGER NOT NULL,
+    redirection_id TEXT NOT NULL,
+    source_chat_id INTEGER NOT NULL,
+    destination_chat_id INTEGER NOT NULL,
+    options TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (user_id, redirection_id)
+);
+CREATE TABLE IF NOT EXISTS peers (
+    user_id INTEGER NOT NULL,
+    peer_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    access_hash INTEGER,
+    PRIMARY KEY (user_id, peer_id)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class Snapshot:
+    """
+    Copia local en SQLite de las redirecciones y de los peers ya resueltos.
+
+    Permite arrancar el reenvío sin esperar a la API; después se reconcilia con ella.
+    Las filas se guardan con el mismo formato que devuelve la API. Con `path` vacío
+    la copia está desactivada y todas las operaciones son nulas.
+    """
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self._db = None
+
+    def _connect(self) -> sqlite3.Connection | None:
+        if not self.path:
+            return None
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Varios workers pueden compartir el archivo: WAL y espera ante bloqueos
+            self._db = sqlite3.connect(self.path, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def load_redirections(self) -> list:
+        db = self._connect()
+        if db is None:
+            return []
+        rows = db.execute(
+            "SELECT user_id, redirection_id, source_chat_id, destination_chat_id, options, updated_at FROM redirections"
+        )
+        return [
+            {
+                "user_id": user_id,
+                "redirection_id": redirection_id,
+                "source_chat_id": source,
+                "destination_chat_id": destination,
+                "options": json.loads(options) if options else None,
+                "updated_at": updated_at,
+            }
+            for user_id, redirection_id, source, destination, options, updated_at in rows
+        ]
+
+    def save_redirections(self, rows: list) -> None:
+        """
+        Guarda filas de la API: las completas se insertan o actualizan y las borradas
+        o sin chats se eliminan.
+        """
+        db = self._connect()
+        if db is None:
+            return
+        upserts = []
+        deletes = []
+        for row in rows:
+            key = (int(row["user_id"]), row["redirection_id"])
+            if row.get("deleted") or not row.get("source_chat_id") or not row.get("destination_chat_id"):
+                deletes.append(key)
+                continue
+            options = row.get("options")
+            if options and not isinstance(options, str):
+                options = json.dumps(options)
+            upserts.append((*key, int(row["source_chat_id"]), int(row["destination_chat_id"]),
+                            options or None, row.get("updated_at")))
+        with db:
+            db.executemany("INSERT OR REPLACE INTO redirections VALUES (?, ?, ?, ?, ?, ?)", upserts)
+            db.executemany("DELETE FROM redirections WHERE user_id = ? AND redirection_id = ?", deletes)
+
+    def load_peers(self, user_id: int) -> dict:
+        """Peers resueltos de una cuenta: `{peer_id: (tipo, access_hash)}`."""
+        db = self._connect()
+        if db is None:
+            return {}
+        rows = db.execute("SELECT peer_id, kind, access_hash FROM peers WHERE user_id = ?", (user_id,))
+        return {peer_id: (kind, access_hash) for peer_id, kind, access_hash in rows}
+
+    def save_peers(self, user_id: int, peers: dict) -> None:
+        db = self._connect()
+        if db is None or not peers:
+            return
+        with db:
+            db.executemany(
+                "INSERT OR REPLACE INTO peers VALUES (?, ?, ?, ?)",
+                [(user_id, peer_id, kind, access_hash) for peer_id, (kind, access_hash) in peers.items()],
+            )
+
+    def get_meta(self, key: str) -> str | None:
+        db = self._connect()
+        if db is None:
+            return None
+        row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str | None) -> None:
+        db = self._connect()
+        if db is None:
+            return
+        with db:
+            db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+# Copia local compartida por todo el proceso
+snapshot = Snapshot(settings.SNAPSHOT_PATH)
@@ -4,10 +4,94 @@ from dotenv import load_dotenv
 load_dotenv()
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-ALLOWED_USERS = os.getenv("ALLOWED_USERS", "").split(",")  # Lista de usuarios permitidos
+# Usuarios permitidos (IDs separados por comas); vacío = cualquier usuario
+ALLOWED_USERS = {int(user_id) for user_id in os.getenv("ALLOWED_USERS", "").split(",") if user_id.strip()}
 API_ID = os.getenv("API_ID")
 API_HASH = os.getenv("API_HASH")
 SESSION_NAME = os.getenv("SESSION_NAME")
 URL_API = os.getenv("URL_API")
 API_KEY = os.getenv("API_KEY")
 SESSION_PATH = os.getenv("SESSION_PATH")
+
+# Límites del mapeo de IDs de mensajes redirigidos (por cuenta)
+MESSAGE_MAP_MAX_ENTRIES = int(os.getenv("MESSAGE_MAP_MAX_ENTRIES", "50000"))  # Por par origen/destino
+MESSAGE_MAP_MAX_AGE = int(os.getenv("MESSAGE_MAP_MAX_AGE", str(7 * 24 * 3600)))  # Segundos
+MESSAGE_MAP_MAX_PAIRS = int(os.getenv("MESSAGE_MAP_MAX_PAIRS", "1000"))
+
+# Límites de envío por cuenta para evitar FloodWait de Telegram
+SEND_RATE_PER_CHAT = float(os.getenv("SEND_RATE_PER_CHAT", "1"))  # Mensajes por segundo por destino
+SEND_BURST_PER_CHAT = float(os.getenv("SEND_BURST_PER_CHAT", "3"))
+SEND_RATE_PER_ACCOUNT = float(os.getenv("SEND_RATE_PER_ACCOUNT", "25"))  # Mensajes por segundo por cuenta
+SEND_BURST_PER_ACCOUNT = float(os.getenv("SEND_BURST_PER_ACCOUNT", "30"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "5"))
+SEND_MAX_FLOOD_WAIT = int(os.getenv("SEND_MAX_FLOOD_WAIT", "300"))  # Segundos
+SEND_QUEUE_MAX_SIZE = int(os.getenv("SEND_QUEUE_MAX_SIZE", "1000"))  # Envíos pendientes por destino; 0 sin límite
+
+# Arranque de redirecciones
+STARTUP_CONCURRENCY = int(os.getenv("STARTUP_CONCURRENCY", "10"))  # Cuentas iniciadas en paralelo
+STARTUP_RETRIES = int(os.getenv("STARTUP_RETRIES", "3"))
+STARTUP_RETRY_DELAY = float(os.getenv("STARTUP_RETRY_DELAY", "1"))  # Segundos, se duplica en cada intento
+
+# Cliente HTTP de la API
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "10"))  # Segundos por solicitud
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "20"))  # Conexiones simultáneas
+
+# Escritura diferida de la configuración de redirecciones
+WRITE_BEHIND_DELAY = float(os.getenv("WRITE_BEHIND_DELAY", "0.5"))  # Segundos antes de enviar los cambios
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "100"))  # Redirecciones por solicitud
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "8"))  # Reintentos ante errores transitorios
+WRITE_BEHIND_MAX_BACKOFF = float(os.getenv("WRITE_BEHIND_MAX_BACKOFF", "60"))  # Espera máxima entre reintentos
+
+# Caché de la lista de chats de /chats
+DIALOG_CACHE_TTL = float(os.getenv("DIALOG_CACHE_TTL", "600"))  # Segundos entre descargas completas
+
+# Pool de clientes de Telethon
+MAX_CLIENTS = int(os.getenv("MAX_CLIENTS", "200"))  # Clientes abiertos a la vez
+CLIENT_IDLE_TIMEOUT = float(os.getenv("CLIENT_IDLE_TIMEOUT", "900"))  # Segundos sin uso antes de cerrar
+
+# Modo multiproceso: número de workers que reparten las cuentas (0 = un solo proceso)
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0"))
+SHARD_SOCKET_DIR = os.getenv("SHARD_SOCKET_DIR", "/tmp")
+
+# Métricas en formato Prometheus (0 = desactivadas); los workers usan los puertos siguientes
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Administradores del bot (IDs separados por comas), p. ej. para /profile
+ADMIN_USERS = {int(user_id) for user_id in os.getenv("ADMIN_USERS", "").split(",") if user_id.strip()}
+
+# Perfilado bajo demanda
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")  # Carpeta de resultados
+PROFILE_LAG_INTERVAL = float(os.getenv("PROFILE_LAG_INTERVAL", "0.1"))  # Segundos entre mediciones del bucle
+PROFILE_BLOCKING_THRESHOLD = float(os.getenv("PROFILE_BLOCKING_THRESHOLD", "0.1"))  # Retraso considerado bloqueo
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10"))
+
+# Sincronización incremental de redirecciones con la API (0 = solo al arrancar)
+# Requiere la función `rpc/get_redirection_changes` en la API, con la columna `updated_at` en cada fila
+# y los borrados marcados con `deleted` (sin borrado físico); sin ella cada consulta responde 404
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "0"))  # Segundos entre consultas
+
+# Copia local de redirecciones y peers para arrancar sin esperar a la API (vacío = desactivada)
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "data/snapshot.sqlite3")
+
+# Modo de recepción de updates del bot: "polling" o "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # URL pública HTTPS del proxy; vacía para no registrar el webhook
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+
+# Procesamiento de updates del bot: en paralelo entre usuarios, en orden por usuario
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "32"))  # Manejadores a la vez
+BOT_MAX_PENDING_UPDATES = int(os.getenv("BOT_MAX_PENDING_UPDATES", "1024"))
+
+# Caché de las comprobaciones de acceso (sesión de Telegram y suscripción)
+ACCESS_CACHE_TTL = float(os.getenv("ACCESS_CACHE_TTL", "300"))  # Segundos
+ACCESS_NEGATIVE_CACHE_TTL = float(os.getenv("ACCESS_NEGATIVE_CACHE_TTL", "30"))  # Sesiones no autorizadas
+
+# Almacén de sesiones de Telethon: "file" (un .session por usuario en SESSION_PATH),
+# "sqlite" (una sola base en SESSION_DB_PATH) o "encrypted" (un archivo cifrado por usuario)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "file")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "data/sessions.sqlite3")
+SESSION_KEY = os.getenv("SESSION_KEY", "")  # Clave de cifrado; obligatoria con "encrypted", opcional con "sqlite"
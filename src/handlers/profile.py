@@ -0,0 +1,67 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import ContextTypes
+from src.config import settings
+from src.sharding import coordinator
+from src.utils import profiling
+
+USAGE = (
+    "Uso: /profile on | off | stats | cpu [segundos] | mem\n\n"
+    "on: empieza a medir los manejadores y el bloqueo del bucle de eventos\n"
+    "off: deja de medir y guarda el resumen en disco\n"
+    "stats: muestra el resumen actual\n"
+    "cpu: perfila la CPU durante unos segundos (10 por defecto)\n"
+    "mem: la primera vez activa tracemalloc; después guarda una instantánea"
+)
+
+
+def format_result(result: dict) -> str:
+    lines = [f"Proceso {result['pid']}:"]
+    if "handlers" in result:
+        lag = result["loop_lag"]
+        lines.append(f"  Retraso del bucle: media {lag['avg_ms']} ms, máx {lag['max_ms']} ms, "
+                     f"bloqueos {lag['blocked']}")
+        for name, stats in list(result["handlers"].items())[:15]:
+            lines.append(f"  {name}: {stats['calls']} llamadas, media {stats['avg_ms']} ms, máx {stats['max_ms']} ms")
+    if "enabled" in result and "handlers" not in result:
+        lines.append("  Perfilado activado." if result["enabled"] else "  Perfilado desactivado.")
+    if result.get("file"):
+        lines.append(f"  Guardado en {result['file']}")
+    elif "file" in result:
+        lines.append("  tracemalloc activado; vuelve a ejecutar /profile mem para guardar una instantánea.")
+    return "\n".join(lines)
+
+
+# Comando /profile, solo para administradores
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if update.effective_user.id not in settings.ADMIN_USERS:
+        await update.message.reply_text("No tienes permiso para usar este comando.")
+        return
+
+    if not context.args or context.args[0] not in ("on", "off", "stats", "cpu", "mem"):
+        await update.message.reply_text(USAGE)
+        return
+
+    action = context.args[0]
+    try:
+        seconds = float(context.args[1]) if len(context.args) > 1 else 10
+    except ValueError:
+        await update.message.reply_text(USAGE)
+        return
+
+    if action == "cpu":
+        await update.message.reply_text(f"Perfilando la CPU durante {seconds:g} segundos...")
+
+    try:
+        # El proceso del bot y, en modo multiproceso, cada worker a la vez
+        local, remote = await asyncio.gather(
+            profiling.run_command(action, seconds),
+            coordinator.profile(action, seconds),
+        )
+        results = [local, *remote]
+    except Exception as e:
+        await update.message.reply_text(f"Error al perfilar: {str(e)}")
+        return
+
+    await update.message.reply_text("\n\n".join(format_result(result) for result in results)[:4096])
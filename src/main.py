@@ -1,9 +1,18 @@
 import asyncio
 from actions.load_redirections import bot_startup
 from bot import start_bot, main
+from src.config.settings import SHARD_WORKERS, METRICS_PORT, METRICS_HOST
+from src.sharding import coordinator
+from src.utils.metrics import start_metrics_server
 
 if __name__ == "__main__":# Obtener el bucle de eventos actual
     loop = asyncio.get_event_loop()
-    loop.create_task(bot_startup())
+    if SHARD_WORKERS > 0:
+        # Repartir las cuentas entre varios procesos worker
+        loop.create_task(coordinator.start_workers(SHARD_WORKERS))
+    else:
+        loop.create_task(bot_startup())
+    # Exponer las métricas de este proceso en /metrics
+    loop.create_task(start_metrics_server(METRICS_PORT, METRICS_HOST))
     start_bot()
     #main()
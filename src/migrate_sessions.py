@@ -0,0 +1,72 @@
+"""
+Migra las sesiones `user_{id}.session` (SQLite de Telethon) al almacén configurado.
+
+Cada sesión se copia como cadena de `StringSession` (DC, servidor y clave de autorización)
+y se comprueba leyéndola de vuelta. La caché de entidades de los archivos antiguos no se
+copia. Los archivos originales se conservan salvo que se indique `--remove`.
+
+Uso:
+    SESSION_BACKEND=sqlite python -m src.migrate_sessions
+    SESSION_BACKEND=encrypted SESSION_KEY=... python -m src.migrate_sessions --source sessions --remove
+    python -m src.migrate_sessions --to sqlite --dry-run
+"""
+import argparse
+import json
+
+from telethon.sessions import StringSession
+
+from src.clients.session_store import FileSessionStore, StringSessionStore, create_store
+from src.config import settings
+
+
+def migrate(source: FileSessionStore, target: StringSessionStore, remove: bool = False, dry_run: bool = False) -> dict:
+    result = {"migrated": 0, "skipped": [], "failed": {}}
+    for user_id in source.user_ids():
+        try:
+            session = source.open(user_id)
+            try:
+                data = StringSession.save(session)
+            finally:
+                session.close()
+            if not data:
+                # Sesión sin clave de autorización: el usuario nunca terminó /connect
+                result["skipped"].append(user_id)
+                continue
+            if dry_run:
+                result["migrated"] += 1
+                continue
+
+            target.write(user_id, data)
+            if target.read(user_id) != data:
+                raise ValueError("la sesión leída no coincide con la original")
+            result["migrated"] += 1
+            if remove:
+                source.delete(user_id)
+        except Exception as e:
+            result["failed"][user_id] = str(e)
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=settings.SESSION_PATH, help="carpeta con los archivos .session")
+    parser.add_argument("--to", choices=("sqlite", "encrypted"), default=settings.SESSION_BACKEND)
+    parser.add_argument("--remove", action="store_true", help="borrar cada archivo .session tras migrarlo")
+    parser.add_argument("--dry-run", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    if args.to not in ("sqlite", "encrypted"):
+        raise SystemExit("Indica el almacén de destino con --to o SESSION_BACKEND (sqlite o encrypted).")
+    target = create_store(args.to)
+    try:
+        result = migrate(FileSessionStore(args.source), target, args.remove, args.dry_run)
+    finally:
+        target.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
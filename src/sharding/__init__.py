@@ -0,0 +1 @@
+from .hashring import HashRing
@@ -0,0 +1,102 @@
+import asyncio
+import multiprocessing
+import os
+
+from src.actions import router
+from src.clients.client_manager import is_authorized
+from src.config import settings
+from .hashring import HashRing
+from .ipc import IpcClient
+from .worker import run_worker
+
+# Procesos worker y sus canales IPC, por índice de worker
+processes = []
+workers = []
+ring = None
+
+
+def enabled() -> bool:
+    return bool(workers)
+
+
+def socket_path(index: int) -> str:
+    return os.path.join(settings.SHARD_SOCKET_DIR, f"bot_reenvio_shard_{index}.sock")
+
+
+async def start_workers(count: int) -> None:
+    """
+    Lanza `count` procesos worker y se conecta a cada uno. Cada worker inicia por su
+    cuenta las redirecciones de los usuarios que le asigna el anillo de hash.
+    """
+    global ring
+    context = multiprocessing.get_context("spawn")
+    for index in range(count):
+        process = context.Process(
+            target=run_worker, args=(index, count, socket_path(index)), name=f"shard-{index}", daemon=True
+        )
+        process.start()
+        processes.append(process)
+
+    clients = []
+    for index in range(count):
+        client = IpcClient(socket_path(index))
+        await client.connect()
+        clients.append(client)
+
+    ring = HashRing(range(count))
+    workers.extend(clients)
+    print(f"{count} workers iniciados.")
+
+
+async def stop_workers() -> None:
+    for client in workers:
+        await client.close()
+    workers.clear()
+    for process in processes:
+        process.terminate()
+        process.join(timeout=5)
+    processes.clear()
+
+
+def worker_for(user_id: int) -> IpcClient:
+    return workers[ring.node_for(user_id)]
+
+
+async def start_redirection(user_id: int, redirection_id: str, source: int, destination: int,
+                            options=None) -> None:
+    """
+    Activa una redirección en el worker dueño de la cuenta, o en este proceso si no hay workers.
+    """
+    if not enabled():
+        await router.start_redirection(user_id, redirection_id, source, destination, options)
+        return
+    await worker_for(user_id).call(
+        "start", user_id=user_id, redirection_id=redirection_id, source=source, destination=destination,
+        options=options,
+    )
+
+
+async def stop_redirection(user_id: int, redirection_id: str) -> bool:
+    if not enabled():
+        return await router.stop_redirection(user_id, redirection_id)
+    return await worker_for(user_id).call("stop", user_id=user_id, redirection_id=redirection_id)
+
+
+async def session_authorized(user_id: int) -> bool:
+    """
+    Comprueba la sesión con el cliente del worker dueño de la cuenta, o en este proceso si no
+    hay workers, para que la sesión no se abra en dos procesos a la vez.
+    """
+    if not enabled():
+        return await is_authorized(user_id)
+    return await worker_for(user_id).call("authorized", user_id=user_id)
+
+
+async def get_dialogs(user_id: int) -> list:
+    """Lista de chats `(categoría, nombre, id)` obtenida del worker dueño de la cuenta."""
+    return await worker_for(user_id).call("dialogs", user_id=user_id)
+
+
+async def profile(action: str, seconds: float = 10) -> list:
+    """Envía una orden de perfilado a todos los workers y devuelve sus resultados."""
+    return await asyncio.gather(*(client.call("profile", action=action, seconds=seconds) for client in workers))
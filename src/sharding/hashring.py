@@ -0,0 +1,27 @@
+import hashlib
+from bisect import bisect
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Anillo de hash consistente: asigna cada usuario a un nodo (worker) de forma estable.
+    Al cambiar el número de nodos solo se reasigna la fracción mínima de usuarios.
+    """
+
+    def __init__(self, nodes, replicas: int = 100):
+        self.nodes = list(nodes)
+        points = sorted(
+            (_hash(f"{node}:{replica}"), node) for node in self.nodes for replica in range(replicas)
+        )
+        self._keys = [key for key, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, user_id: int):
+        if not self._nodes:
+            raise ValueError("El anillo no tiene nodos.")
+        index = bisect(self._keys, _hash(str(user_id))) % len(self._keys)
+        return self._nodes[index]
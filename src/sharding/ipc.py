@@ -0,0 +1,93 @@
+import asyncio
+import itertools
+import json
+
+
+class IpcError(Exception):
+    """Error devuelto por el proceso remoto o fallo del canal IPC."""
+
+
+async def serve(path: str, handler):
+    """
+    Atiende solicitudes JSON (una por línea) en un socket Unix.
+    `handler(request)` devuelve el resultado, que se envía como `{"id", "ok", "result"}`.
+    """
+
+    async def handle_connection(reader, writer):
+        lock = asyncio.Lock()
+
+        async def respond(request):
+            try:
+                response = {"id": request.get("id"), "ok": True, "result": await handler(request)}
+            except Exception as e:
+                response = {"id": request.get("id"), "ok": False, "error": str(e)}
+            async with lock:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                asyncio.create_task(respond(json.loads(line)))
+        finally:
+            writer.close()
+
+    return await asyncio.start_unix_server(handle_connection, path=path)
+
+
+class IpcClient:
+    """
+    Cliente de un socket IPC; admite varias solicitudes simultáneas sobre una sola conexión.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+
+    async def connect(self, retries: int = 50, delay: float = 0.2) -> None:
+        for attempt in range(retries):
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if attempt + 1 == retries:
+                    raise
+                await asyncio.sleep(delay)
+        self._reader_task = asyncio.create_task(self._read_responses())
+
+    async def _read_responses(self) -> None:
+        try:
+            while line := await self._reader.readline():
+                response = json.loads(line)
+                future = self._pending.pop(response["id"], None)
+                if future is None or future.done():
+                    continue
+                if response["ok"]:
+                    future.set_result(response["result"])
+                else:
+                    future.set_exception(IpcError(response["error"]))
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(IpcError(f"Conexión IPC cerrada: {self.path}"))
+            self._pending.clear()
+
+    async def call(self, op: str, **params):
+        if self._writer is None or self._reader_task.done():
+            raise IpcError(f"Conexión IPC no disponible: {self.path}")
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(json.dumps({"id": request_id, "op": op, **params}).encode() + b"\n")
+        await self._writer.drain()
+        return await future
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
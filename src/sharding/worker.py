@@ -0,0 +1,58 @@
+import asyncio
+import os
+
+from src.actions import router
+from src.actions.load_redirections import bot_startup
+from src.clients.client_manager import is_authorized, lease
+from src.clients.dialog_cache import dialog_cache
+from src.config import settings
+from src.utils import profiling
+from src.utils.metrics import start_metrics_server
+from .hashring import HashRing
+from .ipc import serve
+
+
+async def handle_request(request: dict):
+    """
+    Ejecuta una orden recibida del proceso del bot sobre las cuentas de este worker.
+    """
+    op = request["op"]
+    if op == "start":
+        await router.start_redirection(
+            request["user_id"], request["redirection_id"], request["source"], request["destination"],
+            request.get("options"),
+        )
+        return True
+    if op == "stop":
+        return await router.stop_redirection(request["user_id"], request["redirection_id"])
+    if op == "authorized":
+        return await is_authorized(request["user_id"])
+    if op == "dialogs":
+        async with lease(request["user_id"]) as client:
+            dialogs = await dialog_cache.get_or_load(request["user_id"], client)
+        return list(dialogs.values())
+    if op == "profile":
+        return await profiling.run_command(request["action"], request.get("seconds", 10))
+    raise ValueError(f"Operación desconocida: {op}")
+
+
+async def worker_main(index: int, count: int, socket_path: str) -> None:
+    ring = HashRing(range(count))
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = await serve(socket_path, handle_request)
+    print(f"Worker {index}/{count} escuchando en {socket_path} (pid {os.getpid()}).")
+    if settings.METRICS_PORT:
+        # Cada worker exporta sus propias métricas en el puerto siguiente al del bot
+        await start_metrics_server(settings.METRICS_PORT + 1 + index, settings.METRICS_HOST)
+
+    # Iniciar solo las cuentas asignadas a este worker
+    await bot_startup(user_filter=lambda user_id: ring.node_for(user_id) == index)
+    async with server:
+        await server.serve_forever()
+
+
+def run_worker(index: int, count: int, socket_path: str) -> None:
+    """Punto de entrada del proceso worker."""
+    asyncio.run(worker_main(index, count, socket_path))
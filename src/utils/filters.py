@@ -0,0 +1,193 @@
+import re
+
+from telethon.tl import types
+
+
+class KeywordMatcher:
+    """
+    Autómata de Aho-Corasick: busca muchas palabras clave a la vez en una sola pasada
+    por el texto, sin importar cuántas haya. La búsqueda no distingue mayúsculas.
+    """
+
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [False]
+        for keyword in keywords:
+            keyword = keyword.casefold()
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(False)
+                state = next_state
+            self.output[state] = True
+
+        # Enlaces de fallo en orden de anchura, como en el algoritmo original
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                candidate = self.goto[fallback].get(char, 0)
+                # Los hijos de la raíz vuelven a la raíz
+                self.fail[next_state] = candidate if candidate != next_state else 0
+                self.output[next_state] = self.output[next_state] or self.output[self.fail[next_state]]
+
+    def __bool__(self) -> bool:
+        return len(self.goto) > 1
+
+    def search(self, text: str) -> bool:
+        """True si alguna palabra clave aparece en `text`."""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for char in text.casefold():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
+
+
+# Tipos de documento según sus atributos, del más específico al más general
+_DOCUMENT_TYPES = (
+    (types.DocumentAttributeSticker, "sticker"),
+    (types.DocumentAttributeAnimated, "gif"),
+    (types.DocumentAttributeVideo, "video"),
+    (types.DocumentAttributeAudio, "audio"),
+)
+
+_MEDIA_TYPES = {
+    types.MessageMediaPhoto: "photo",
+    types.MessageMediaWebPage: "text",
+    types.MessageMediaPoll: "poll",
+    types.MessageMediaGeo: "location",
+    types.MessageMediaGeoLive: "location",
+    types.MessageMediaVenue: "location",
+    types.MessageMediaContact: "contact",
+}
+
+
+def media_type(message) -> str:
+    """
+    Tipo de contenido de un mensaje: text, photo, video, video_note, gif, sticker,
+    audio, voice, document, poll, location, contact u other.
+    """
+    media = message.media
+    if media is None:
+        return "text"
+    if isinstance(media, types.MessageMediaDocument) and media.document is not None:
+        attributes = getattr(media.document, "attributes", ())
+        for attribute_type, name in _DOCUMENT_TYPES:
+            for attribute in attributes:
+                if isinstance(attribute, attribute_type):
+                    if name == "video" and attribute.round_message:
+                        return "video_note"
+                    if name == "audio" and attribute.voice:
+                        return "voice"
+                    return name
+        return "document"
+    return _MEDIA_TYPES.get(type(media), "other")
+
+
+class MessageFilter:
+    """
+    Filtro compilado de una redirección. Se construye una sola vez a partir de la
+    especificación guardada en las opciones (`options["filters"]`):
+
+        {
+            "keywords": [...], "exclude_keywords": [...],    # subcadenas, sin distinguir mayúsculas
+            "regex": [...], "exclude_regex": [...],          # expresiones regulares de Python
+            "media": [...], "exclude_media": [...],          # tipos de `media_type`
+            "senders": [...], "exclude_senders": [...]       # IDs de remitente
+        }
+
+    Las listas de inclusión exigen al menos una coincidencia y las de exclusión descartan
+    el mensaje con una sola. Las comprobaciones se hacen de la más barata a la más cara.
+    """
+
+    def __init__(self, spec: dict):
+        unknown = set(spec) - {
+            "keywords", "exclude_keywords", "regex", "exclude_regex",
+            "media", "exclude_media", "senders", "exclude_senders",
+        }
+        if unknown:
+            raise ValueError(f"Filtros desconocidos: {', '.join(sorted(unknown))}")
+
+        self.senders = frozenset(int(sender) for sender in spec.get("senders", ()))
+        self.exclude_senders = frozenset(int(sender) for sender in spec.get("exclude_senders", ()))
+        self.media = frozenset(spec.get("media", ()))
+        self.exclude_media = frozenset(spec.get("exclude_media", ()))
+        self.keywords = KeywordMatcher(spec.get("keywords", ()))
+        self.exclude_keywords = KeywordMatcher(spec.get("exclude_keywords", ()))
+        try:
+            self.regex = [re.compile(pattern) for pattern in spec.get("regex", ())]
+            self.exclude_regex = [re.compile(pattern) for pattern in spec.get("exclude_regex", ())]
+        except re.error as e:
+            raise ValueError(f"Expresión regular no válida: {str(e)}") from e
+        # Mensajes descartados por cada filtro
+        self.hits = {}
+
+    def check(self, message) -> str | None:
+        """Devuelve el nombre del filtro que descarta el mensaje, o None si se debe reenviar."""
+        rejected = self._reject(message)
+        if rejected is not None:
+            self.hits[rejected] = self.hits.get(rejected, 0) + 1
+        return rejected
+
+    def check_album(self, messages: list) -> str | None:
+        """
+        Un álbum se reenvía completo si alguno de sus mensajes pasa el filtro
+        (normalmente el texto va solo en el primero).
+        """
+        rejected = None
+        for message in messages:
+            rejected = self._reject(message)
+            if rejected is None:
+                return None
+        self.hits[rejected] = self.hits.get(rejected, 0) + 1
+        return rejected
+
+    def _reject(self, message) -> str | None:
+        if self.senders or self.exclude_senders:
+            sender_id = message.sender_id
+            if self.senders and sender_id not in self.senders:
+                return "senders"
+            if sender_id in self.exclude_senders:
+                return "exclude_senders"
+
+        if self.media or self.exclude_media:
+            kind = media_type(message)
+            if self.media and kind not in self.media:
+                return "media"
+            if kind in self.exclude_media:
+                return "exclude_media"
+
+        text = message.message or ""
+        if self.exclude_keywords and self.exclude_keywords.search(text):
+            return "exclude_keywords"
+        if self.keywords and not self.keywords.search(text):
+            return "keywords"
+        if any(pattern.search(text) for pattern in self.exclude_regex):
+            return "exclude_regex"
+        if self.regex and not any(pattern.search(text) for pattern in self.regex):
+            return "regex"
+        return None
+
+
+def compile_filter(spec) -> MessageFilter | None:
+    """Compila la especificación de filtros de una redirección; None si no tiene filtros."""
+    if not spec:
+        return None
+    if not isinstance(spec, dict):
+        raise ValueError("Los filtros de la redirección deben ser un objeto.")
+    return MessageFilter(spec)
@@ -0,0 +1,128 @@
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+
+class _PairMap:
+    """
+    Mapeo `id origen -> id destino` de un par (chat origen, chat destino).
+    Los IDs se guardan en arrays de enteros ordenados por ID de origen; como Telegram
+    asigna IDs crecientes dentro de cada chat, insertar es casi siempre un `append`.
+    """
+
+    __slots__ = ("source_ids", "destination_ids", "stamps")
+
+    def __init__(self):
+        self.source_ids = array("q")
+        self.destination_ids = array("q")
+        self.stamps = array("q")
+
+    def __len__(self) -> int:
+        return len(self.source_ids)
+
+    def put(self, source_id: int, destination_id: int, stamp: int) -> None:
+        ids = self.source_ids
+        if not ids or source_id > ids[-1]:
+            ids.append(source_id)
+            self.destination_ids.append(destination_id)
+            self.stamps.append(stamp)
+            return
+
+        index = bisect_left(ids, source_id)
+        if index < len(ids) and ids[index] == source_id:
+            self.destination_ids[index] = destination_id
+            self.stamps[index] = stamp
+            return
+
+        insort(ids, source_id)
+        self.destination_ids.insert(index, destination_id)
+        self.stamps.insert(index, stamp)
+
+    def get(self, source_id: int, cutoff: int = 0):
+        ids = self.source_ids
+        index = bisect_left(ids, source_id)
+        if index < len(ids) and ids[index] == source_id and self.stamps[index] >= cutoff:
+            return self.destination_ids[index]
+        return None
+
+    def trim(self, count: int) -> None:
+        """Elimina las `count` entradas más antiguas."""
+        del self.source_ids[:count]
+        del self.destination_ids[:count]
+        del self.stamps[:count]
+
+    def expired(self, cutoff: int) -> int:
+        """Cantidad de entradas iniciales anteriores a `cutoff`."""
+        count = 0
+        for stamp in self.stamps:
+            if stamp >= cutoff:
+                break
+            count += 1
+        return count
+
+    def nbytes(self) -> int:
+        return sum(a.buffer_info()[1] * a.itemsize for a in (self.source_ids, self.destination_ids, self.stamps))
+
+
+class MessageMap:
+    """
+    Almacén acotado de IDs de mensajes clonados por (chat origen, chat destino, ID de mensaje).
+
+    - `max_entries`: máximo de entradas por par; al superarlo se descartan las más antiguas.
+    - `max_age`: segundos tras los que una entrada deja de ser útil para ediciones y respuestas.
+    - `max_pairs`: máximo de pares; se descarta el par usado menos recientemente (LRU).
+    """
+
+    def __init__(self, max_entries: int = 50000, max_age: int = 7 * 24 * 3600, max_pairs: int = 1000):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.max_pairs = max_pairs
+        self.pairs = OrderedDict()
+        self.evicted = 0
+
+    def put(self, source: int, destination: int, source_id: int, destination_id: int) -> None:
+        key = (source, destination)
+        pair = self.pairs.get(key)
+        if pair is None:
+            pair = self.pairs[key] = _PairMap()
+            while len(self.pairs) > self.max_pairs:
+                _, dropped = self.pairs.popitem(last=False)
+                self.evicted += len(dropped)
+        else:
+            self.pairs.move_to_end(key)
+
+        now = int(time.time())
+        pair.put(source_id, destination_id, now)
+
+        # Recortar por bloques para amortizar el coste de desplazar los arrays
+        if len(pair) > self.max_entries:
+            count = len(pair) - self.max_entries + max(1, self.max_entries // 10)
+            pair.trim(count)
+            self.evicted += count
+        elif self.max_age and pair.stamps[0] < now - self.max_age:
+            count = pair.expired(now - self.max_age)
+            pair.trim(count)
+            self.evicted += count
+
+    def get(self, source: int, destination: int, source_id: int):
+        key = (source, destination)
+        pair = self.pairs.get(key)
+        if pair is None:
+            return None
+        self.pairs.move_to_end(key)
+        # Las entradas caducadas no se devuelven aunque el siguiente `put` aún no las haya recortado
+        cutoff = int(time.time()) - self.max_age if self.max_age else 0
+        return pair.get(source_id, cutoff)
+
+    def drop(self, source: int, destination: int) -> None:
+        """Elimina el mapeo completo de un par, por ejemplo al detener la redirección."""
+        self.pairs.pop((source, destination), None)
+
+    def stats(self) -> dict:
+        return {
+            "pairs": len(self.pairs),
+            "entries": sum(len(pair) for pair in self.pairs.values()),
+            "bytes": sum(pair.nbytes() for pair in self.pairs.values()),
+            "evicted": self.evicted,
+        }
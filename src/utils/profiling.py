@@ -0,0 +1,200 @@
+import asyncio
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+
+from ..config import settings
+
+# Estado del modo de perfilado; los envoltorios solo miden mientras está activo
+enabled = False
+handler_stats = {}
+loop_lag = {"samples": 0, "total": 0.0, "max": 0.0, "blocked": 0}
+_monitor = None
+_cpu_profile_running = False
+
+
+def wrap(name: str, callback):
+    """
+    Envuelve un manejador asíncrono para medir su tiempo de ejecución cuando el perfilado está activo.
+    Desactivado, el coste es una comprobación de un booleano por llamada.
+    """
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        if not enabled:
+            return await callback(*args, **kwargs)
+
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - started)
+
+    return wrapper
+
+
+def record(name: str, elapsed: float) -> None:
+    stats = handler_stats.get(name)
+    if stats is None:
+        stats = handler_stats[name] = {"calls": 0, "total": 0.0, "max": 0.0}
+    stats["calls"] += 1
+    stats["total"] += elapsed
+    stats["max"] = max(stats["max"], elapsed)
+
+
+def instrument_application(application) -> None:
+    """Envuelve los callbacks de todos los manejadores registrados en la aplicación de PTB."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = wrap(f"bot.{handler.callback.__name__}", handler.callback)
+
+
+async def monitor_loop_lag(interval: float) -> None:
+    """
+    Mide cuánto se retrasa el bucle de eventos respecto a un temporizador periódico.
+    Un retraso alto indica código síncrono que bloquea el reenvío de todas las cuentas.
+    """
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - expected)
+        loop_lag["samples"] += 1
+        loop_lag["total"] += lag
+        loop_lag["max"] = max(loop_lag["max"], lag)
+        if lag >= settings.PROFILE_BLOCKING_THRESHOLD:
+            loop_lag["blocked"] += 1
+
+
+def enable() -> None:
+    global enabled, _monitor
+    enabled = True
+    if _monitor is None:
+        _monitor = asyncio.create_task(monitor_loop_lag(settings.PROFILE_LAG_INTERVAL))
+
+
+def disable() -> None:
+    global enabled, _monitor
+    enabled = False
+    if _monitor is not None:
+        _monitor.cancel()
+        _monitor = None
+
+
+def reset() -> None:
+    handler_stats.clear()
+    loop_lag.update(samples=0, total=0.0, max=0.0, blocked=0)
+
+
+def snapshot() -> dict:
+    """Resumen de tiempos por manejador y del bloqueo del bucle de eventos."""
+    handlers = {
+        name: {
+            "calls": stats["calls"],
+            "total_ms": round(stats["total"] * 1000, 3),
+            "avg_ms": round(stats["total"] / stats["calls"] * 1000, 3),
+            "max_ms": round(stats["max"] * 1000, 3),
+        }
+        for name, stats in sorted(handler_stats.items(), key=lambda item: item[1]["total"], reverse=True)
+    }
+    samples = loop_lag["samples"]
+    return {
+        "pid": os.getpid(),
+        "enabled": enabled,
+        "handlers": handlers,
+        "loop_lag": {
+            "samples": samples,
+            "avg_ms": round(loop_lag["total"] / samples * 1000, 3) if samples else 0.0,
+            "max_ms": round(loop_lag["max"] * 1000, 3),
+            "blocked": loop_lag["blocked"],
+        },
+    }
+
+
+def _output_path(name: str) -> str:
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(settings.PROFILE_DIR, f"{stamp}-{os.getpid()}-{name}")
+
+
+def dump_stats() -> str:
+    """Guarda el resumen actual en disco y devuelve la ruta del archivo."""
+    path = _output_path("handlers.json")
+    with open(path, "w") as file:
+        json.dump(snapshot(), file, indent=2)
+    return path
+
+
+async def profile_cpu(seconds: float) -> str:
+    """
+    Perfila con cProfile todo lo que ejecuta el bucle de eventos durante `seconds` segundos.
+    Guarda el perfil binario (`.prof`, para snakeviz o pstats) y un resumen en texto.
+    """
+    global _cpu_profile_running
+    if _cpu_profile_running:
+        raise RuntimeError("Ya hay un perfil de CPU en curso.")
+
+    _cpu_profile_running = True
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+        _cpu_profile_running = False
+
+    path = _output_path("cpu")
+    profiler.dump_stats(f"{path}.prof")
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(50)
+    with open(f"{path}.txt", "w") as file:
+        file.write(text.getvalue())
+    return f"{path}.prof"
+
+
+def snapshot_memory() -> str | None:
+    """
+    Guarda una instantánea de tracemalloc con las 50 líneas que más memoria reservan.
+    La primera llamada solo empieza a rastrear y devuelve None.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(settings.PROFILE_TRACEMALLOC_FRAMES)
+        return None
+
+    snapshot = tracemalloc.take_snapshot()
+    path = _output_path("memory")
+    snapshot.dump(f"{path}.snapshot")
+    with open(f"{path}.txt", "w") as file:
+        for stat in snapshot.statistics("lineno")[:50]:
+            file.write(f"{stat}\n")
+    return f"{path}.snapshot"
+
+
+def stop_memory() -> None:
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+async def run_command(action: str, seconds: float = 10) -> dict:
+    """
+    Ejecuta una orden de perfilado en este proceso: on, off, stats, cpu o mem.
+    Los workers la reciben por IPC desde el bot.
+    """
+    if action == "on":
+        reset()
+        enable()
+        return {"pid": os.getpid(), "enabled": True}
+    if action == "off":
+        disable()
+        stop_memory()
+        return {"pid": os.getpid(), "enabled": False, "file": dump_stats()}
+    if action == "stats":
+        return snapshot()
+    if action == "cpu":
+        return {"pid": os.getpid(), "file": await profile_cpu(seconds)}
+    if action == "mem":
+        return {"pid": os.getpid(), "file": snapshot_memory()}
+    raise ValueError(f"Acción de perfilado desconocida: {action}")
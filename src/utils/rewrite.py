@@ -0,0 +1,183 @@
+import copy
+import re
+from bisect import bisect_right
+
+from telethon.extensions import markdown
+from telethon.helpers import del_surrogate
+from telethon.tl import types
+
+# Enlaces visibles en el texto y menciones de usuarios de Telegram
+URL_PATTERN = r"(?:https?://|www\.|t\.me/)[^\s]+"
+MENTION_PATTERN = r"(?<![\w@])@[A-Za-z][A-Za-z0-9_]{3,31}\b"
+
+# Caracteres fuera del plano básico, que en UTF-16 ocupan dos unidades (emojis, etc.)
+_ASTRAL = re.compile("[\U00010000-\U0010FFFF]")
+
+
+def _surrogate_pair(match) -> str:
+    code = ord(match.group()) - 0x10000
+    return chr(0xD800 + (code >> 10)) + chr(0xDC00 + (code & 0x3FF))
+
+
+def add_surrogate(text: str) -> str:
+    """
+    Como `telethon.helpers.add_surrogate`, para que los índices del texto coincidan con los
+    offsets UTF-16 de las entidades, pero recorriendo en Python solo los caracteres afectados.
+    """
+    return _ASTRAL.sub(_surrogate_pair, text)
+
+
+def trie_pattern(words) -> str:
+    """
+    Convierte una lista de literales en una expresión regular con forma de trie, de modo que
+    los prefijos comunes se comparan una sola vez y el coste en cada posición depende de la
+    longitud de las palabras y no de cuántas haya. Prefiere siempre la coincidencia más larga.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # La palabra puede terminar aquí; el cuantificador voraz intenta antes la más larga
+            return "(?:" + pattern + ")?"
+        return pattern
+
+    return build(trie)
+
+
+class Rewriter:
+    """
+    Reglas de reescritura de una redirección, compiladas en una sola expresión regular
+    a partir de `options["rewrite"]`:
+
+        {
+            "replace": {"texto": "reemplazo", ...},   # literales, distinguiendo mayúsculas
+            "mentions": "@canal" | {"@a": "@b", ...}, # todas las menciones o solo algunas ("" las quita)
+            "strip_links": true,                      # quitar enlaces visibles y ocultos
+            "signature": "\\n\\nVía @canal"            # texto añadido al final
+        }
+
+    El texto se recorre una sola vez y las entidades (negritas, enlaces, menciones...)
+    se desplazan para seguir apuntando al mismo texto, en unidades UTF-16 como Telegram.
+    """
+
+    def __init__(self, spec: dict):
+        unknown = set(spec) - {"replace", "mentions", "strip_links", "signature"}
+        if unknown:
+            raise ValueError(f"Reglas de reescritura desconocidas: {', '.join(sorted(unknown))}")
+
+        self.replacements = {
+            add_surrogate(old): add_surrogate(new) for old, new in dict(spec.get("replace") or {}).items() if old
+        }
+        mentions = spec.get("mentions")
+        if isinstance(mentions, dict):
+            self.mention_default = None
+            self.mention_map = {old.lower(): add_surrogate(new) for old, new in mentions.items()}
+        else:
+            self.mention_default = None if mentions is None else add_surrogate(str(mentions))
+            self.mention_map = {}
+        self.strip_links = bool(spec.get("strip_links"))
+        self.signature = add_surrogate(spec.get("signature") or "")
+
+        # Los enlaces van primero para no tocar menciones o literales dentro de una URL
+        alternatives = []
+        if self.strip_links:
+            alternatives.append(f"(?P<url>{URL_PATTERN})")
+        if self.replacements:
+            alternatives.append(f"(?P<literal>{trie_pattern(self.replacements)})")
+        if self.mention_default is not None or self.mention_map:
+            alternatives.append(f"(?P<mention>{MENTION_PATTERN})")
+        self.pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    def _replacement(self, match) -> str | None:
+        kind = match.lastgroup
+        if kind == "url":
+            return ""
+        if kind == "literal":
+            return self.replacements[match.group()]
+        mention = self.mention_map.get(match.group().lower())
+        return mention if mention is not None else self.mention_default
+
+    def apply(self, text: str, entities=None) -> tuple[str, list]:
+        """
+        Devuelve `(texto, entidades)` reescritos. Las entidades que cambian de posición son
+        copias; las que quedan vacías o eran enlaces ocultos con `strip_links` se descartan.
+        """
+        text = add_surrogate(text or "")
+        edits = []
+        if self.pattern is not None:
+            for match in self.pattern.finditer(text):
+                replacement = self._replacement(match)
+                if replacement is not None and replacement != match.group():
+                    edits.append((match.start(), match.end(), replacement))
+
+        pieces = []
+        position = 0
+        for start, end, replacement in edits:
+            pieces.append(text[position:start])
+            pieces.append(replacement)
+            position = end
+        pieces.append(text[position:])
+        pieces.append(self.signature)
+
+        return del_surrogate("".join(pieces)), self._shift_entities(entities or (), edits)
+
+    def apply_markdown(self, text: str, entities=None) -> str:
+        """Igual que `apply`, pero devuelve el resultado como Markdown (para los pies de un álbum)."""
+        return markdown.unparse(*self.apply(text, entities))
+
+    def _shift_entities(self, entities, edits) -> list:
+        if not edits:
+            return [
+                entity for entity in entities
+                if not (self.strip_links and isinstance(entity, types.MessageEntityTextUrl))
+            ]
+
+        ends = [end for _, end, _ in edits]
+        # Desplazamiento acumulado después de cada edición
+        shifts = [0]
+        for start, end, replacement in edits:
+            shifts.append(shifts[-1] + len(replacement) - (end - start))
+
+        def move(position: int, is_end: bool) -> int:
+            index = bisect_right(ends, position)
+            if index < len(edits) and edits[index][0] < position:
+                # La posición cae dentro de un fragmento reemplazado: ajustarla a sus bordes
+                start, _, replacement = edits[index]
+                return start + shifts[index] + (len(replacement) if is_end else 0)
+            return position + shifts[index]
+
+        shifted = []
+        for entity in entities:
+            if self.strip_links and isinstance(entity, types.MessageEntityTextUrl):
+                continue
+            offset = move(entity.offset, False)
+            length = move(entity.offset + entity.length, True) - offset
+            if length <= 0:
+                continue
+            if offset != entity.offset or length != entity.length:
+                entity = copy.copy(entity)
+                entity.offset = offset
+                entity.length = length
+            shifted.append(entity)
+        return shifted
+
+
+def compile_rewrite(spec) -> Rewriter | None:
+    """Compila las reglas de reescritura de una redirección; None si no tiene reglas."""
+    if not spec:
+        return None
+    if not isinstance(spec, dict):
+        raise ValueError("Las reglas de reescritura deben ser un objeto.")
+    try:
+        return Rewriter(spec)
+    except re.error as e:
+        raise ValueError(f"Reglas de reescritura no válidas: {str(e)}") from e
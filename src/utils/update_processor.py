@@ -0,0 +1,58 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Procesa en paralelo los updates de usuarios distintos y en orden los de un mismo usuario,
+    porque el flujo de /connect (`user_states`) depende de recibir los mensajes en secuencia.
+
+    `max_concurrent_updates` limita los manejadores en ejecución a la vez. El semáforo de
+    `BaseUpdateProcessor` se usa solo como tope de updates pendientes (`max_pending_updates`),
+    ya que se adquiere antes de saber de qué usuario es el update: si limitara la concurrencia,
+    un usuario con muchos mensajes en cola ocuparía todos los huecos esperando su turno.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int = 1024):
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self._limit = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # Candado por usuario y cuántos updates lo esperan, para liberarlo al quedar sin uso
+        self._locks = {}
+
+    @staticmethod
+    def ordering_key(update) -> int | None:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update, coroutine) -> None:
+        key = self.ordering_key(update)
+        if key is None:
+            async with self._limit:
+                await coroutine
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._limit:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
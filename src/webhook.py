@@ -0,0 +1,90 @@
+import asyncio
+import hmac
+import signal
+import time
+
+from aiohttp import web
+from telegram import Update
+
+from src.config import settings
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def webhook_app(application) -> web.Application:
+    """
+    Servidor HTTP que recibe los updates de Telegram y los pasa a la cola de la aplicación.
+
+    Pensado para escuchar en local detrás de un proxy inverso que termina TLS (nginx, Caddy...):
+    el proxy publica `WEBHOOK_URL` por HTTPS y reenvía las peticiones a `WEBHOOK_LISTEN:WEBHOOK_PORT`.
+    """
+    stats = {"started_at": time.monotonic(), "updates": 0, "rejected": 0}
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if settings.WEBHOOK_SECRET and not hmac.compare_digest(
+                request.headers.get(SECRET_HEADER, ""), settings.WEBHOOK_SECRET):
+            stats["rejected"] += 1
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except Exception:
+            stats["rejected"] += 1
+            return web.Response(status=400)
+
+        # Responder enseguida; los manejadores procesan el update desde la cola
+        await application.update_queue.put(update)
+        stats["updates"] += 1
+        return web.Response()
+
+    async def handle_health(request: web.Request) -> web.Response:
+        healthy = application.running
+        return web.json_response({
+            "status": "ok" if healthy else "stopping",
+            "uptime": round(time.monotonic() - stats["started_at"], 1),
+            "updates": stats["updates"],
+            "rejected": stats["rejected"],
+            "queued": application.update_queue.qsize(),
+        }, status=200 if healthy else 503)
+
+    app = web.Application()
+    app.router.add_post(f"/{settings.WEBHOOK_PATH.strip('/')}", handle_update)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+async def serve_webhook(application) -> None:
+    """
+    Ejecuta la aplicación en modo webhook dentro del bucle de eventos actual, el mismo que
+    usan los clientes de Telethon, con el mismo ciclo de vida que `run_polling`.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+
+    runner = web.AppRunner(webhook_app(application), access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, settings.WEBHOOK_LISTEN, settings.WEBHOOK_PORT).start()
+        await application.start()
+        if settings.WEBHOOK_URL:
+            url = f"{settings.WEBHOOK_URL.rstrip('/')}/{settings.WEBHOOK_PATH.strip('/')}"
+            await application.bot.set_webhook(
+                url, secret_token=settings.WEBHOOK_SECRET or None, allowed_updates=Update.ALL_TYPES
+            )
+            print(f"Webhook registrado en {url}")
+        print(f"El bot está ejecutándose en modo webhook en {settings.WEBHOOK_LISTEN}:{settings.WEBHOOK_PORT}...")
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
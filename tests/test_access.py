@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from telegram import Chat, Message, Update, User
+from telegram.ext import ApplicationHandlerStop
+
+from src.auth import access
+
+
+def make_update(user_id: int, text: str) -> Update:
+    user = User(user_id, "usuario", False)
+    message = Message(1, datetime.now(), Chat(user_id, "private"), from_user=user, text=text)
+    return Update(1, message=message)
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    sent = []
+
+    async def reply_text(self, text, **kwargs):
+        sent.append(text)
+
+    monkeypatch.setattr(Message, "reply_text", reply_text)
+    monkeypatch.setattr(access.settings, "ALLOWED_USERS", set())
+    access.invalidate(1)
+    yield sent
+    access.invalidate(1)
+
+
+def test_guard_denies_when_check_session_raises(monkeypatch, replies):
+    async def check_session(user_id):
+        raise RuntimeError("worker no disponible")
+
+    monkeypatch.setattr(access, "check_session", check_session)
+
+    with pytest.raises(ApplicationHandlerStop):
+        asyncio.run(access.access_guard(make_update(1, "/chats"), None))
+    assert replies == ["No se pudo comprobar tu cuenta en este momento. Inténtalo de nuevo más tarde."]
+
+
+def test_guard_ignores_session_for_free_commands(monkeypatch, replies):
+    async def check_session(user_id):
+        raise RuntimeError("no se debe consultar")
+
+    monkeypatch.setattr(access, "check_session", check_session)
+
+    asyncio.run(access.access_guard(make_update(1, "/start"), None))
+    assert replies == []
+
+
+def test_check_session_stays_local_during_connect(monkeypatch):
+    async def session_authorized(user_id):
+        raise AssertionError("no se debe abrir la sesión en el worker durante /connect")
+
+    monkeypatch.setattr(access.session_store, "exists", lambda user_id: True)
+    monkeypatch.setattr(access.coordinator, "session_authorized", session_authorized)
+    monkeypatch.setattr(access, "connecting", {1})
+    access.invalidate(1)
+
+    assert asyncio.run(access.check_session(1)) is False
+    access.mark_session(1, True)
+    assert asyncio.run(access.check_session(1)) is True
+    access.invalidate(1)